@@ -0,0 +1,31 @@
+import importlib
+import os
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def render_service(service_name="water_bodies", workflow_id="water-bodies"):
+    """Render the template into tests/<service_name>, where the tests import it from."""
+    # imported here, so that importing the rendered service does not load cookiecutter
+    from cookiecutter.main import cookiecutter
+
+    cookiecutter(
+        os.path.dirname(TESTS_DIR),
+        extra_context={"service_name": service_name, "workflow_id": workflow_id},
+        output_dir=TESTS_DIR,
+        no_input=True,
+        overwrite_if_exists=True,
+    )
+
+
+class ServiceTestCase(unittest.TestCase):
+    """Renders the service once for the test case and imports its modules."""
+
+    @classmethod
+    def setUpClass(cls):
+        render_service()
+        cls.service = importlib.import_module("tests.water_bodies.service")
+        cls.handler = importlib.import_module("tests.water_bodies.handler")
+        cls.stac_io = importlib.import_module("tests.water_bodies.stac_io")
+        cls.worker = importlib.import_module("tests.water_bodies.worker")
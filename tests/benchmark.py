@@ -0,0 +1,360 @@
+"""
+Offline benchmark of the execution handler of the generated service.
+
+The service runs against local stand-ins: an in-process S3-compatible server
+(moto), a fake Workspace API and a stub ZooCalrissianRunner whose "job" is a
+synthetic output catalog of N items written beforehand. Each size runs in its
+own process, so that the peak RSS reported is the one of the handler alone.
+The catalog has the layout stage-out writes, its items in a collection, unless
+`--layout items` puts them directly under the catalog.
+
+Run it from the repository root with:
+
+    python -m tests.benchmark --sizes 10,1000,50000
+
+Results are appended as JSON lines, tagged with the current commit, to
+bench_output.txt so that runs can be compared between commits.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVICE_NAME = "water_bodies"
+WORKFLOW_ID = "water-bodies"
+BUCKET = "benchmark"
+
+# phases reported from the timing record of the execution
+PHASES = ["pre_execution_hook", "post_execution_hook", "handle_outputs"]
+
+
+class FakeWorkspaceAPI(BaseHTTPRequestHandler):
+    """
+    Workspace API answering every lookup with the credentials of the local S3 server.
+    """
+
+    s3_endpoint = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if "/collections/" in self.path:
+            self.reply(200, {"type": "Collection"})
+        else:
+            self.reply(
+                200,
+                {
+                    "storage": {
+                        "credentials": {
+                            "endpoint": self.s3_endpoint,
+                            "access": "benchmark",
+                            "secret": "benchmark",
+                            "region": "us-east-1",
+                            "bucketname": BUCKET,
+                        }
+                    }
+                },
+            )
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply(200, {})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_catalog(client, usid, size, layout="stage-out", manifest=True):
+    """
+    Write an output catalog of `size` items, and their manifest, and return its URI.
+
+    With the "stage-out" layout, the items are in a collection, child of the catalog,
+    as tests/assets/stageout.yaml writes them. With the "items" layout, they are
+    directly under the catalog, which post_execution_hook falls back to.
+    """
+    prefix = f"processing-results/{usid}"
+    base = f"s3://{BUCKET}/{prefix}"
+
+    def put(key, document):
+        client.put_object(
+            Bucket=BUCKET, Key=f"{prefix}/{key}", Body=json.dumps(document).encode("utf-8")
+        )
+
+    # the folder of the items, relative to the catalog
+    folder = f"{usid}/" if layout == "stage-out" else ""
+    up = "../../" if layout == "stage-out" else "../"
+
+    def item(index):
+        item_id = f"item-{index}"
+        key = f"{folder}{item_id}/{item_id}.json"
+        links = [{"rel": "root", "href": f"{up}catalog.json", "type": "application/json"}]
+        if layout == "stage-out":
+            links += [
+                {"rel": rel, "href": "../collection.json", "type": "application/json"}
+                for rel in ("parent", "collection")
+            ]
+        document = {
+            "type": "Feature",
+            "stac_version": "1.0.0",
+            "id": item_id,
+            "geometry": {"type": "Point", "coordinates": [0.0, 0.0]},
+            "bbox": [0.0, 0.0, 0.0, 0.0],
+            "properties": {"datetime": "2024-01-01T00:00:00Z"},
+            "links": links,
+            "assets": {
+                band: {
+                    "href": f"{base}/{folder}{item_id}/{band}.tif",
+                    "type": "image/tiff; application=geotiff",
+                    "roles": ["data"],
+                }
+                for band in ("green", "nir", "water")
+            },
+        }
+        if layout == "stage-out":
+            document["collection"] = usid
+        put(key, document)
+        self_link = {"rel": "self", "href": f"{base}/{key}", "type": "application/json"}
+        link = {"rel": "item", "href": f"./{item_id}/{item_id}.json", "type": "application/json"}
+        return link, {**document, "links": document["links"] + [self_link]}
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        links, documents = zip(*executor.map(item, range(size))) if size else ((), ())
+    if manifest:
+        client.put_object(
+            Bucket=BUCKET,
+            Key=f"{prefix}/items.ndjson",
+            Body="".join(json.dumps(document) + "\n" for document in documents).encode("utf-8"),
+            ContentType="application/x-ndjson",
+        )
+
+    root_link = {"rel": "root", "href": "./catalog.json", "type": "application/json"}
+    if layout == "stage-out":
+        put(
+            f"{usid}/collection.json",
+            {
+                "type": "Collection",
+                "stac_version": "1.0.0",
+                "id": usid,
+                "title": "Processing results",
+                "description": "description",
+                "license": "proprietary",
+                "keywords": ["eoepca"],
+                "extent": {
+                    "spatial": {"bbox": [[-180, -90, 180, 90]]},
+                    "temporal": {"interval": [["2024-01-01T00:00:00Z", "2024-01-01T23:59:59Z"]]},
+                },
+                "links": [
+                    {**root_link, "href": "../catalog.json"},
+                    {"rel": "parent", "href": "../catalog.json", "type": "application/json"},
+                    *links,
+                    {
+                        "rel": "self",
+                        "href": f"{base}/{usid}/collection.json",
+                        "type": "application/json",
+                    },
+                ],
+            },
+        )
+        links = [{"rel": "child", "href": f"./{usid}/collection.json", "type": "application/json"}]
+    put(
+        "catalog.json",
+        {
+            "type": "Catalog",
+            "stac_version": "1.0.0",
+            "id": "catalog",
+            "description": "benchmark catalog",
+            "links": [root_link, *links],
+        },
+    )
+    return f"{base}/catalog.json"
+
+
+def run_execution(size, usid, catalog_uri, workspace_url, tmp_path):
+    """
+    Run the service entry point with a stub runner, in this process, and return its
+    metrics.
+    """
+    service = __import__(f"tests.{SERVICE_NAME}.service", fromlist=["service"])
+    handler = __import__(f"tests.{SERVICE_NAME}.handler", fromlist=["handler"])
+
+    class StubRunner:
+        def __init__(self, cwl, conf, inputs, outputs, execution_handler):
+            self.conf = conf
+            self.execution_handler = execution_handler
+
+        def get_namespace_name(self):
+            return f"{WORKFLOW_ID}-{self.conf['lenv']['usid']}"
+
+        def execute(self):
+            self.execution_handler.pre_execution_hook()
+            output = {"StacCatalogUri": catalog_uri}
+            self.execution_handler.post_execution_hook("", output, {}, [])
+            self.execution_handler.handle_outputs("", output, {}, [])
+            return service.zoo.SERVICE_SUCCEEDED
+
+    handler.EoepcaCalrissianRunner = StubRunner
+
+    conf = {
+        "lenv": {"Identifier": WORKFLOW_ID, "usid": usid, "message": ""},
+        "main": {"tmpPath": tmp_path, "tmpUrl": "http://localhost:8080"},
+        "eoepca": {"workspace_url": workspace_url, "workspace_prefix": "benchmark"},
+        "additional_parameters": {},
+    }
+    outputs = {"stac": {"value": ""}}
+
+    start = time.perf_counter()
+    status = getattr(service, WORKFLOW_ID.replace("-", "_"))(conf, {}, outputs)
+    wall_time = time.perf_counter() - start
+
+    with open(os.path.join(tmp_path, f"{WORKFLOW_ID}-{usid}", "timings.json")) as stream:
+        spans = json.load(stream)["spans"]
+    phases = {
+        phase: sum(span["duration"] for span in spans if span["name"].split("/")[-1] == phase)
+        for phase in PHASES
+    }
+
+    return {
+        "items": size,
+        "status": status,
+        "wall_time": round(wall_time, 3),
+        **{phase: round(duration, 3) for phase, duration in phases.items()},
+        "items_per_second": (
+            round(size / phases["post_execution_hook"], 1) if phases["post_execution_hook"] else None
+        ),
+        "output_bytes": len(outputs["stac"]["value"] or ""),
+        # kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes", default="10,1000,50000", help="comma separated numbers of output items"
+    )
+    parser.add_argument("--output", default="bench_output.txt", help="file the results are appended to")
+    parser.add_argument(
+        "--layout",
+        choices=["stage-out", "items"],
+        default="stage-out",
+        help="items in a collection, as stage-out writes them, or directly under the catalog",
+    )
+    parser.add_argument("--no-manifest", action="store_true", help="write no item manifest")
+    # internal: run a single execution, in a child process
+    parser.add_argument("--child", nargs=4, metavar=("SIZE", "USID", "CATALOG_URI", "WORKSPACE_URL"))
+    args = parser.parse_args()
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+    if args.child:
+        size, usid, catalog_uri, workspace_url = args.child
+        with tempfile.TemporaryDirectory() as tmp_path:
+            print(json.dumps(run_execution(int(size), usid, catalog_uri, workspace_url, tmp_path)))
+        return
+
+    import boto3
+    from cookiecutter.main import cookiecutter
+    from moto.server import ThreadedMotoServer
+
+    cookiecutter(
+        root,
+        extra_context={"service_name": SERVICE_NAME, "workflow_id": WORKFLOW_ID},
+        output_dir=os.path.join(root, "tests"),
+        no_input=True,
+        overwrite_if_exists=True,
+    )
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    s3_port = free_port()
+    s3_server = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port, verbose=False)
+    s3_server.start()
+    s3_endpoint = f"http://127.0.0.1:{s3_port}"
+
+    FakeWorkspaceAPI.s3_endpoint = s3_endpoint
+    workspace_api = ThreadingHTTPServer(("127.0.0.1", 0), FakeWorkspaceAPI)
+    threading.Thread(target=workspace_api.serve_forever, daemon=True).start()
+    workspace_url = f"http://127.0.0.1:{workspace_api.server_port}"
+
+    client = boto3.client(
+        "s3",
+        endpoint_url=s3_endpoint,
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+        region_name="us-east-1",
+    )
+    client.create_bucket(Bucket=BUCKET)
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True
+    ).stdout.strip()
+
+    env = {**os.environ, "SERVICES_NAMESPACE": "user", "HTTP_PROXY": ""}
+    results = []
+    try:
+        for size in (int(size) for size in args.sizes.split(",")):
+            usid = f"benchmark-{size}"
+            catalog_uri = write_catalog(
+                client, usid, size, layout=args.layout, manifest=not args.no_manifest
+            )
+            child = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "tests.benchmark",
+                    "--child",
+                    str(size),
+                    usid,
+                    catalog_uri,
+                    workspace_url,
+                ],
+                cwd=root,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if child.returncode != 0:
+                sys.stderr.write(child.stderr)
+                raise RuntimeError(f"benchmark of {size} items failed")
+            result = {
+                "commit": commit,
+                "timestamp": int(time.time()),
+                "layout": args.layout,
+                "manifest": not args.no_manifest,
+                **json.loads(child.stdout.splitlines()[-1]),
+            }
+            results.append(result)
+            print(json.dumps(result))
+    finally:
+        workspace_api.shutdown()
+        s3_server.stop()
+
+    with open(os.path.join(root, args.output), "a") as stream:
+        for result in results:
+            stream.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import importlib
+import json
+import os
+import tempfile
+
+from tests import ServiceTestCase
+
+
+def fake_execute(conf, inputs, outputs, member=None):
+    service = importlib.import_module("tests.water_bodies.service")
+    if inputs["stac_items"]["value"] == "bad":
+        conf["lenv"]["message"] = "bad item"
+        return service.zoo.SERVICE_FAILED
+    member["feature_collection"] = json.dumps(
+        {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "id": f"{inputs['stac_items']['value']}-{member['identity']['username']}",
+                    "pid": os.getpid(),
+                },
+                {"id": conf["lenv"]["usid"], "pid": os.getpid()},
+            ],
+            "id": conf["lenv"]["usid"],
+        }
+    )
+    return service.zoo.SERVICE_SUCCEEDED
+
+
+class TestBatch(ServiceTestCase):
+    def setUp(self):
+        handler_class = self.handler.EoepcaCalrissianRunnerExecutionHandler
+        self.lookups = []
+        self.registrations = []
+        credentials = {
+            "endpoint": "http://s3",
+            "access": "a",
+            "secret": "s",
+            "region": "r",
+            "bucketname": "b",
+        }
+
+        def get_workspace_credentials(handler):
+            self.lookups.append(handler.username)
+            return credentials
+
+        def register_outputs(handler, catalog_uri, collection_id):
+            collection = json.loads(handler.feature_collection)
+            self.registrations.append((catalog_uri, collection_id, collection))
+
+        patches = {
+            (self.handler, "execute"): fake_execute,
+            (handler_class, "get_workspace_credentials"): get_workspace_credentials,
+            (handler_class, "register_outputs"): register_outputs,
+        }
+        for (owner, name), value in patches.items():
+            self.addCleanup(setattr, owner, name, getattr(owner, name))
+            setattr(owner, name, value)
+        os.environ["SERVICES_NAMESPACE"] = "eric"
+        self.addCleanup(os.environ.pop, "SERVICES_NAMESPACE")
+
+    def execute(self, input_sets):
+        conf = {
+            "lenv": {"Identifier": "water-bodies", "usid": "batch", "message": ""},
+            "main": {"tmpPath": tempfile.mkdtemp(), "tmpUrl": "http://localhost/tmp"},
+            "eoepca": {
+                "workspace_url": "http://workspace",
+                "workspace_prefix": "ws",
+                "batch_concurrency": "2",
+            },
+        }
+        outputs = {"stac": {"value": ""}}
+        status = self.service.water_bodies_batch(
+            conf, {"input_sets": {"value": json.dumps(input_sets)}}, outputs
+        )
+        return status, conf, outputs
+
+    def test_batch(self):
+        status, _, outputs = self.execute([{"stac_items": f"item-{i}"} for i in range(5)])
+
+        self.assertEqual(status, self.service.zoo.SERVICE_SUCCEEDED)
+        collection = json.loads(outputs["stac"]["value"])
+        self.assertEqual(collection["id"], "batch")
+        ids = [feature["id"] for feature in collection["features"]]
+        self.assertEqual(ids[::2], [f"item-{i}-eric" for i in range(5)])
+        self.assertEqual(ids[1::2], [f"batch-{i}" for i in range(5)])
+        self.assertEqual({feature["collection"] for feature in collection["features"]}, {"batch"})
+        # members run in at most two worker processes, not in this one
+        pids = {feature["pid"] for feature in collection["features"]}
+        self.assertLessEqual(len(pids), 2)
+        self.assertNotIn(os.getpid(), pids)
+
+        self.assertEqual(self.lookups, ["eric"])
+        self.assertEqual(len(self.registrations), 1)
+        self.assertEqual(self.registrations[0][:2], (None, "batch"))
+        self.assertEqual(len(self.registrations[0][2]["features"]), 10)
+
+    def test_failed_members(self):
+        status, conf, outputs = self.execute([{"stac_items": "item-0"}, {"stac_items": "bad"}])
+
+        self.assertEqual(status, self.service.zoo.SERVICE_FAILED)
+        self.assertEqual(len(json.loads(outputs["stac"]["value"])["features"]), 2)
+        self.assertEqual(len(self.registrations), 1)
+
+    def test_process_description(self):
+        with open(
+            os.path.join(os.path.dirname(self.service.__file__), "water_bodies_batch.zcfg")
+        ) as stream:
+            zcfg = stream.read()
+
+        self.assertTrue(zcfg.startswith("[water_bodies_batch]"))
+        self.assertIn("serviceProvider = water_bodies.service", zcfg)
+        self.assertIn("[input_sets]", zcfg)
@@ -0,0 +1,135 @@
+import datetime
+import json
+import os
+import tempfile
+
+import pystac
+from pystac.stac_io import DefaultStacIO
+from pystac.utils import make_absolute_href
+
+from tests import ServiceTestCase
+
+
+def write_nested_catalog(path):
+    """Write a catalog with items at every level of its children, return its href."""
+
+    def item(index):
+        item = pystac.Item(
+            f"item-{index}",
+            {"type": "Point", "coordinates": [float(index), 0.0]},
+            [float(index), 0.0, float(index), 0.0],
+            datetime.datetime(2024, 1, 1),
+            {},
+        )
+        item.add_asset("data", pystac.Asset(f"./item-{index}.tif", media_type=pystac.MediaType.GEOTIFF))
+        return item
+
+    extent = pystac.Extent(
+        pystac.SpatialExtent([[-180.0, -90.0, 180.0, 90.0]]),
+        pystac.TemporalExtent([[datetime.datetime(2024, 1, 1), None]]),
+    )
+    catalog = pystac.Catalog("catalog", "root catalog")
+    child = pystac.Catalog("child", "child catalog")
+    grandchild = pystac.Catalog("grandchild", "grandchild catalog")
+    collection = pystac.Collection("collection", "collection", extent)
+    catalog.add_items([item(0), item(1)])
+    catalog.add_child(child)
+    child.add_items([item(2), item(3)])
+    child.add_child(grandchild)
+    grandchild.add_item(item(4))
+    catalog.add_child(collection)
+    collection.add_items([item(5), item(6)])
+
+    catalog.normalize_hrefs(path)
+    catalog.save(pystac.CatalogType.SELF_CONTAINED)
+    return os.path.join(path, "catalog.json")
+
+
+class TestCatalogItems(ServiceTestCase):
+    def setUp(self):
+        self.href = write_nested_catalog(tempfile.mkdtemp())
+
+    def test_walk_matches_get_all_items(self):
+        expected = [
+            (
+                item.id,
+                item.get_self_href(),
+                {(link.rel, link.get_absolute_href()) for link in item.links},
+            )
+            for item in pystac.read_file(self.href).get_all_items()
+        ]
+
+        for max_workers in (1, 4):
+            walked = [
+                (
+                    document["id"],
+                    href,
+                    # the documents are as stored, with relative links and no self link
+                    {(link["rel"], make_absolute_href(link["href"], href)) for link in document["links"]}
+                    | {("self", href)},
+                )
+                for href, document in self.stac_io.iter_catalog_items(
+                    self.href, DefaultStacIO(), max_workers=max_workers
+                )
+            ]
+            self.assertEqual(walked, expected)
+        self.assertEqual([item_id for item_id, _, _ in expected], [f"item-{i}" for i in range(7)])
+
+    def test_features_match_item_collection(self):
+        self.maxDiff = None
+        conf = {
+            "lenv": {"Identifier": "water-bodies", "usid": "usid"},
+            "main": {"tmpPath": tempfile.mkdtemp()},
+        }
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf)
+        storage = {
+            "storage:platform": "EOEPCA",
+            "storage:requester_pays": False,
+            "storage:tier": "Standard",
+            "storage:region": conf["additional_parameters"]["STAGEOUT_AWS_REGION"],
+            "storage:endpoint": conf["additional_parameters"]["STAGEOUT_AWS_SERVICEURL"],
+        }
+
+        # the collection as post_execution_hook built it before streaming the features
+        items = []
+        for item in pystac.read_file(self.href).get_all_items():
+            for key in item.assets.keys():
+                asset = item.assets[key].to_dict()
+                asset.update(storage)
+                item.assets[key] = item.assets[key].from_dict(asset)
+            item.collection_id = "collection-id"
+            items.append(item.clone())
+        expected = pystac.ItemCollection(items=items).to_dict()
+        expected["id"] = "collection-id"
+
+        for compact in (False, True):
+            features = execution_handler.iter_output_features(
+                self.stac_io.iter_catalog_items(self.href, DefaultStacIO(), max_workers=4),
+                "collection-id",
+            )
+            found = self.handler.dump_feature_collection(features, "collection-id", compact=compact)
+            self.assertEqual(json.loads(found), expected)
+
+    def test_manifest_features(self):
+        conf = {
+            "lenv": {"Identifier": "water-bodies", "usid": "usid"},
+            "main": {"tmpPath": tempfile.mkdtemp()},
+        }
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf)
+        stac_io = self.stac_io.CustomStacIO()
+
+        self.assertIsNone(execution_handler.read_manifest_features(self.href, stac_io, "collection-id"))
+
+        # the items as stage-out lists them, with their self link
+        with open(os.path.join(os.path.dirname(self.href), "items.ndjson"), "w") as stream:
+            for item in pystac.read_file(self.href).get_all_items():
+                stream.write(json.dumps(item.to_dict(include_self_link=True)) + "\n")
+        found = execution_handler.read_manifest_features(self.href, stac_io, "collection-id")
+
+        expected = self.handler.dump_feature_collection(
+            execution_handler.iter_output_features(
+                self.stac_io.iter_catalog_items(self.href, DefaultStacIO()), "collection-id"
+            ),
+            "collection-id",
+        )
+        self.assertEqual(json.loads(found), json.loads(expected))
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from loguru import logger
+
+from tests import render_service
+
+# budget, in milliseconds, for importing the generated service module, which is
+# all a ZOO-Kernel process pays for when executions go to the warm worker pool;
+# import times depend on the machine, so the default is generous and a runner of
+# known speed sets a tighter one
+COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS") or 1000)
+
+# modules that must only be loaded by the code paths that use them
+DEFERRED_MODULES = ["zoo_calrissian_runner", "boto3", "botocore", "pystac", "requests", "jwt", "yaml"]
+
+
+class TestColdStart(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.service_name = "water_bodies"
+        cls.workflow_id = "water-bodies"
+
+        render_service(cls.service_name, cls.workflow_id)
+
+        # -X importtime reports "self [us] | cumulative [us] | package" lines on stderr
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                f"import tests.{cls.service_name}.service",
+            ],
+            cwd=f"{os.path.dirname(__file__)}/..",
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        lines = [line for line in result.stderr.splitlines() if line.startswith("import time:")]
+        cls.service_imports = {}
+        for line in lines[1:]:
+            _, cumulative, package = line.split("|")
+            cls.service_imports[package.strip()] = int(cumulative) / 1000
+
+    def test_heavy_modules_are_deferred(self):
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, self.service_imports, f"{module} is imported at service start-up")
+
+    def test_cold_start_budget(self):
+        elapsed = self.service_imports[f"tests.{self.service_name}.service"]
+        logger.info(f"Service import took {elapsed:.1f} ms (budget {COLD_START_BUDGET_MS:.0f} ms)")
+
+        self.assertLessEqual(elapsed, COLD_START_BUDGET_MS)
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+from tests import ServiceTestCase
+
+
+def job_event(succeeded=None, failed=None):
+    return {
+        "type": "MODIFIED",
+        "object": SimpleNamespace(status=SimpleNamespace(succeeded=succeeded, failed=failed)),
+    }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestJobCompletion(ServiceTestCase):
+    def test_watch_wakes_up_on_completion(self):
+        clock = FakeClock()
+        state = {"complete": False}
+        timeouts = []
+
+        def job_events(timeout):
+            timeouts.append(timeout)
+            yield job_event()
+            state["complete"] = True
+            yield job_event(succeeded=1)
+            raise AssertionError("watch not stopped on completion")
+
+        completed = self.handler.wait_for_completion(
+            lambda: state["complete"],
+            job_events=job_events,
+            max_interval=30,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+        self.assertTrue(completed)
+        self.assertEqual(timeouts, [30])
+        self.assertEqual(clock.sleeps, [])
+
+    def test_polling_backs_off_when_watch_fails(self):
+        clock = FakeClock()
+        checks = iter([False] * 6 + [True])
+
+        def job_events(timeout):
+            raise RuntimeError("403 Forbidden")
+
+        completed = self.handler.wait_for_completion(
+            lambda: next(checks),
+            job_events=job_events,
+            min_interval=1,
+            max_interval=10,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+        self.assertTrue(completed)
+        self.assertEqual(clock.sleeps, [1, 2, 4, 8, 10, 10])
+
+    def test_wall_time(self):
+        clock = FakeClock()
+
+        completed = self.handler.wait_for_completion(
+            lambda: False, wall_time=5, min_interval=2, max_interval=30, clock=clock, sleep=clock.sleep
+        )
+
+        self.assertFalse(completed)
+        self.assertEqual(clock.sleeps, [2, 3])
+
+    def test_runner_executions_are_watched(self):
+        for job_completion, watched in (("watch", True), ("poll", False)):
+            runner = self.handler.EoepcaCalrissianRunner.__new__(self.handler.EoepcaCalrissianRunner)
+            runner.handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(
+                conf={"eoepca": {"job_completion": job_completion, "job_poll_min_interval": "0.5"}}
+            )
+
+            # as the runner creates the execution of its job
+            runner.execution = self.handler.CalrissianExecution(job="job", runtime_context="context")
+
+            self.assertEqual(
+                isinstance(runner.execution, self.handler.WatchedCalrissianExecution), watched
+            )
+            self.assertEqual(
+                (runner.execution.job, runner.execution.runtime_context), ("job", "context")
+            )
+            if watched:
+                self.assertEqual(runner.execution.min_interval, 0.5)
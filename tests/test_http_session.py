@@ -0,0 +1,64 @@
+import http.server
+import threading
+
+from tests import ServiceTestCase
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = {}
+    connections = set()
+
+    def do_GET(self):
+        self.connections.add(self.client_address)
+        if self.failures.get(self.path, 0) > 0:
+            self.failures[self.path] -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f'{{"id": "{self.path[1:]}"}}'.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSessionCache(ServiceTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Handler.connections.clear()
+        self.stac_io.http_session_cache.clear()
+        self.stac_io.http_session_cache.configure(backoff=0)
+        self.stac_io.stac_document_cache.configure()
+        self.reader = self.stac_io.CustomStacIO(
+            region_name="us-east-1", aws_access_key_id="key", aws_secret_access_key="secret"
+        )
+
+    def test_connection_is_reused(self):
+        for i in range(5):
+            self.assertEqual(self.reader.read_json(f"{self.url}/item-{i}"), {"id": f"item-{i}"})
+
+        self.assertEqual(len(Handler.connections), 1)
+        self.assertEqual(self.stac_io.http_session_cache.stats()["sessions"], 1)
+
+    def test_retries(self):
+        Handler.failures["/flaky"] = 2
+
+        self.assertEqual(self.reader.read_json(f"{self.url}/flaky"), {"id": "flaky"})
+        self.assertEqual(Handler.failures["/flaky"], 0)
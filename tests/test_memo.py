@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+
+from tests import ServiceTestCase
+
+
+class TestExecutionMemo(ServiceTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.app_package = os.path.join(os.path.dirname(cls.handler.__file__), "app-package.cwl")
+
+    def memo(self, **kwargs):
+        tmp_path = tempfile.mkdtemp()
+        store = self.handler.LocalResultStore(os.path.join(tmp_path, "results"))
+        return self.handler.ExecutionMemo(os.path.join(tmp_path, "memo.json"), store, **kwargs)
+
+    def test_key_normalizes_inputs(self):
+        key = self.handler.ExecutionMemo.key
+        inputs = {
+            "aoi": {"value": "1,2,3,4", "dataType": "string"},
+            "bands": {"value": ["green", "nir"]},
+        }
+        same = {"bands": {"value": ["green", "nir"], "isArray": "true"}, "aoi": {"value": " 1,2,3,4 "}}
+        other = {"aoi": {"value": "1,2,3,5"}, "bands": {"value": ["green", "nir"]}}
+
+        self.assertEqual(key("eric", inputs, self.app_package), key("eric", same, self.app_package))
+        self.assertNotEqual(key("eric", inputs, self.app_package), key("eric", other, self.app_package))
+        self.assertNotEqual(key("eric", inputs, self.app_package), key("bob", inputs, self.app_package))
+
+    def test_lookup_and_age_eviction(self):
+        memo = self.memo(max_age=3600)
+        memo.record("a", '{"id": "a"}', "s3://bucket/a/catalog.json")
+
+        entry, feature_collection = memo.lookup("a")
+        self.assertEqual(entry["catalog_uri"], "s3://bucket/a/catalog.json")
+        self.assertEqual(feature_collection, '{"id": "a"}')
+        self.assertIsNone(memo.lookup("b"))
+
+        memo.max_age = 0
+        self.assertIsNone(memo.lookup("a"))
+        self.assertIsNone(memo.store.get("a"))
+
+    def test_size_eviction(self):
+        memo = self.memo(max_bytes=25)
+        memo.record("a", "x" * 10, "s3://bucket/a/catalog.json")
+        time.sleep(0.01)
+        memo.record("b", "x" * 10, "s3://bucket/b/catalog.json")
+        time.sleep(0.01)
+        # a was used last, so b is the least recently used once c is added
+        memo.lookup("a")
+        memo.record("c", "x" * 10, "s3://bucket/c/catalog.json")
+
+        self.assertIsNotNone(memo.lookup("a"))
+        self.assertIsNone(memo.lookup("b"))
+        self.assertIsNotNone(memo.lookup("c"))
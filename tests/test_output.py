@@ -0,0 +1,53 @@
+import json
+import tempfile
+
+from tests import ServiceTestCase
+
+
+class TestOutput(ServiceTestCase):
+    def execution_handler(self, **eoepca):
+        conf = {
+            "lenv": {"Identifier": "water-bodies", "usid": "usid"},
+            "main": {"tmpPath": tempfile.mkdtemp(), "tmpUrl": "http://localhost/tmp"},
+            "eoepca": eoepca,
+            "additional_parameters": {},
+        }
+        return self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf)
+
+    def test_compact_feature_collection(self):
+        features = [
+            {"type": "Feature", "id": f"item-{i}", "properties": {"name": "é"}} for i in range(3)
+        ]
+        expected = {"type": "FeatureCollection", "features": features, "id": "collection"}
+
+        for found in (
+            self.handler.dump_feature_collection(iter(features), "collection", compact=True),
+            self.handler.dump_feature_collection(iter([]), "collection", compact=True),
+        ):
+            self.assertNotIn(" ", found.replace('"é"', ""))
+            self.assertEqual(json.loads(found)["id"], "collection")
+        self.assertEqual(
+            json.loads(self.handler.dump_feature_collection(features, "collection", compact=True)),
+            expected,
+        )
+
+    def test_output_by_reference(self):
+        execution_handler = self.execution_handler(output_compact="true", output_inline_max_size="50")
+        outputs = {"stac": {"value": ""}}
+
+        execution_handler.feature_collection = execution_handler.dumps({"id": "small"})
+        execution_handler.set_output(outputs)
+        self.assertEqual(outputs["stac"]["value"], '{"id":"small"}')
+
+        execution_handler.feature_collection = execution_handler.dumps(
+            {"id": "large", "features": [{}] * 50}
+        )
+        execution_handler.set_output(outputs)
+        # ZOO reads the generated file, and references it when the client asks for one
+        self.assertEqual(list(outputs["stac"]), ["generated_file"])
+        with open(outputs["stac"]["generated_file"]) as stream:
+            self.assertEqual(stream.read(), execution_handler.feature_collection)
+
+        execution_handler.feature_collection = execution_handler.dumps({"id": "small"})
+        execution_handler.set_output(outputs)
+        self.assertEqual(outputs["stac"], {"value": '{"id":"small"}'})
@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+
+from pystac.stac_io import DefaultStacIO
+
+from tests import ServiceTestCase
+
+
+class TestInputChecks(ServiceTestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.item = self.write_item(
+            "item",
+            bbox=[-121.4, 37.7, -120.0, 38.7],
+            assets={
+                "green": {"href": "green.tif"},
+                "B08": {"href": "B08.tif", "eo:bands": [{"name": "B08", "common_name": "nir"}]},
+            },
+        )
+
+    def write_item(self, item_id, bbox, assets):
+        path = os.path.join(self.tmp_path, f"{item_id}.json")
+        with open(path, "w") as stream:
+            json.dump({"type": "Feature", "id": item_id, "bbox": bbox, "assets": assets}, stream)
+        return path
+
+    def check(self, **inputs):
+        inputs = {name: {"value": value} for name, value in inputs.items()}
+        self.handler.check_stac_inputs(inputs, DefaultStacIO(), max_workers=4)
+
+    def test_valid_inputs(self):
+        self.check(
+            stac_items=[self.item],
+            bands=["green", "nir"],
+            aoi="-121.4,37.9,-121.0,38.1",
+            epsg="EPSG:4326",
+        )
+        # without items there is nothing to check
+        self.check(aoi="not a bbox")
+
+    def test_problems_are_reported_together(self):
+        other = self.write_item(
+            "other", bbox=[10.0, 40.0, 11.0, 41.0], assets={"red": {"href": "red.tif"}}
+        )
+        missing = os.path.join(self.tmp_path, "missing.json")
+
+        with self.assertRaises(self.handler.InputValidationError) as raised:
+            self.check(
+                stac_items=[self.item, other, missing],
+                bands=["green", "nir"],
+                aoi="-121.4,37.9,-121.0,38.1",
+            )
+
+        lines = str(raised.exception).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn(f"{other} has no asset for the bands green, nir (assets: red)", lines[0])
+        self.assertIn(f"{other} with bbox [10.0, 40.0, 11.0, 41.0] does not intersect", lines[1])
+        self.assertIn(f"cannot read {missing}", lines[2])
+
+    def test_aoi_in_other_crs_is_not_compared(self):
+        self.check(stac_items=[self.item], aoi="500000,4000000,600000,4100000", epsg="EPSG:32610")
+
+        with self.assertRaises(self.handler.InputValidationError):
+            self.check(stac_items=[self.item], aoi="1,2,3")
+
+    def test_stagein_assets(self):
+        conf = {"eoepca": {"stagein_select_assets": "true", "stagein_always_include": "metadata, nir"}}
+        inputs = {"bands": {"value": ["green", "nir"]}}
+
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf, inputs=inputs)
+        self.assertEqual(execution_handler.stagein_assets(), ["green", "nir", "metadata"])
+
+        # without bands nothing is filtered
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf, inputs={})
+        self.assertEqual(execution_handler.stagein_assets(), [])
+
+    def test_stagein_aoi(self):
+        conf = {"eoepca": {"stagein_aoi_window": "true", "stagein_aoi_margin": "8"}}
+        inputs = {"aoi": {"value": "-121.399,39.834,-120.74,40.472"}, "epsg": {"value": "EPSG:4326"}}
+
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf, inputs=inputs)
+        self.assertEqual(
+            execution_handler.stagein_aoi(),
+            {
+                "STAGEIN_AOI": "-121.399,39.834,-120.74,40.472",
+                "STAGEIN_AOI_EPSG": "EPSG:4326",
+                "STAGEIN_AOI_MARGIN": "8",
+            },
+        )
+
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf={}, inputs=inputs)
+        self.assertEqual(execution_handler.stagein_aoi()["STAGEIN_AOI"], "")
+
+    def test_items_read_with_stagein_credentials(self):
+        stac_io = self.stac_io
+        created = []
+
+        class RecordingStacIO(DefaultStacIO):
+            def __init__(self, **kwargs):
+                super().__init__()
+                created.append(kwargs)
+
+        conf = {"eoepca": {"preflight": "true"}, "additional_parameters": {}}
+        inputs = {"stac_items": {"value": [self.item]}}
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf, inputs=inputs)
+        conf["additional_parameters"]["STAGEIN_AWS_ACCESS_KEY_ID"] = "user-key"
+
+        custom_stac_io = stac_io.CustomStacIO
+        stac_io.CustomStacIO = RecordingStacIO
+        try:
+            execution_handler.check_inputs()
+        finally:
+            stac_io.CustomStacIO = custom_stac_io
+
+        self.assertEqual(created[0]["aws_access_key_id"], "user-key")
+        self.assertEqual(
+            created[0]["endpoint_url"], conf["additional_parameters"]["STAGEIN_AWS_SERVICEURL"]
+        )
+        self.assertEqual(
+            created[0]["aws_secret_access_key"],
+            conf["additional_parameters"]["STAGEIN_AWS_SECRET_ACCESS_KEY"],
+        )
+        self.assertTrue(execution_handler.inputs_checked)
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from tests import ServiceTestCase
+
+
+class FakeOrigin:
+    """Serves one document per URL, answering conditional requests like S3 or HTTP."""
+
+    def __init__(self):
+        self.documents = {}
+        self.requests = []
+
+    def fetch(self, url):
+        def fetch(validators):
+            self.requests.append((url, validators))
+            text, etag = self.documents[url]
+            if validators is not None and validators["etag"] == etag:
+                return None
+            return text, etag, None
+
+        return fetch
+
+
+class TestStacDocumentCache(ServiceTestCase):
+    def setUp(self):
+        self.origin = FakeOrigin()
+        self.origin.documents["s3://bucket/item.json"] = ('{"id": "item"}', '"v1"')
+
+    def read(self, cache, url="s3://bucket/item.json", scope=""):
+        return cache.read(url, self.origin.fetch(url), scope=scope)
+
+    def test_fresh_documents_are_read_from_disk(self):
+        cache = self.stac_io.StacDocumentCache(tempfile.mkdtemp(), max_age=3600)
+
+        self.assertEqual(self.read(cache), '{"id": "item"}')
+        self.assertEqual(self.read(cache), '{"id": "item"}')
+
+        self.assertEqual(len(self.origin.requests), 1)
+        self.assertEqual(cache.stats(), {"hits": 1, "revalidated": 0, "misses": 1, "evictions": 0})
+
+    def test_stale_documents_are_revalidated(self):
+        cache = self.stac_io.StacDocumentCache(tempfile.mkdtemp(), max_age=0)
+
+        self.read(cache)
+        self.assertEqual(self.read(cache), '{"id": "item"}')
+        self.assertEqual(self.origin.requests[-1][1]["etag"], '"v1"')
+
+        self.origin.documents["s3://bucket/item.json"] = ('{"id": "item", "changed": true}', '"v2"')
+        self.assertEqual(self.read(cache), '{"id": "item", "changed": true}')
+
+        self.assertEqual(len(self.origin.requests), 3)
+        self.assertEqual(cache.stats(), {"hits": 0, "revalidated": 1, "misses": 2, "evictions": 0})
+
+    def test_documents_are_kept_per_scope(self):
+        path = tempfile.mkdtemp()
+        cache = self.stac_io.StacDocumentCache(path, max_age=3600)
+
+        self.read(cache, scope="user-a")
+        self.read(cache, scope="user-b")
+        self.read(cache, scope="user-a")
+
+        # other credentials read the document again
+        self.assertEqual(len(self.origin.requests), 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+        for name in os.listdir(path):
+            self.assertEqual(os.stat(os.path.join(path, name)).st_mode & 0o777, 0o600)
+
+    def test_s3_scope_is_the_credentials(self):
+        stac_io = self.stac_io.CustomStacIO(
+            endpoint_url="http://s3", aws_access_key_id="a", aws_secret_access_key="s"
+        )
+        same = self.stac_io.CustomStacIO(
+            endpoint_url="http://s3", aws_access_key_id="a", aws_secret_access_key="s"
+        )
+        other = self.stac_io.CustomStacIO(
+            endpoint_url="http://s3", aws_access_key_id="b", aws_secret_access_key="s"
+        )
+
+        self.assertEqual(stac_io.s3_cache_scope, same.s3_cache_scope)
+        self.assertNotEqual(stac_io.s3_cache_scope, other.s3_cache_scope)
+
+    def test_size_bound(self):
+        path = tempfile.mkdtemp()
+        cache = self.stac_io.StacDocumentCache(path, max_age=3600, max_bytes=1000)
+        for i in range(10):
+            url = f"s3://bucket/item-{i}.json"
+            self.origin.documents[url] = ("x" * 200, f'"{i}"')
+            self.read(cache, url)
+            # entries are ordered by the time they were validated
+            os.utime(cache._entry_path(url, ""), (time.time() - 100 + i, time.time() - 100 + i))
+
+        self.assertLessEqual(
+            sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)), 1000
+        )
+        self.assertGreater(cache.stats()["evictions"], 0)
+        self.read(cache, "s3://bucket/item-9.json")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_disabled_without_path(self):
+        cache = self.stac_io.StacDocumentCache()
+
+        self.read(cache)
+        self.read(cache)
+
+        self.assertEqual(len(self.origin.requests), 2)
+
+    def test_s3_proxy_bypassed_by_no_proxy(self):
+        cache = self.stac_io.S3ClientCache()
+        proxies = {"https": "http://proxy:3128"}
+
+        with mock.patch.dict(os.environ, {"NO_PROXY": "s3.internal"}):
+            bypassed = cache.get_client(endpoint_url="https://s3.internal:9000", proxies=proxies)
+            proxied = cache.get_client(endpoint_url="https://s3.example.com", proxies=proxies)
+
+        self.assertIsNone(
+            bypassed._endpoint.http_session._proxy_config.proxy_url_for("https://s3.internal:9000")
+        )
+        self.assertEqual(
+            proxied._endpoint.http_session._proxy_config.proxy_url_for("https://s3.example.com"),
+            "http://proxy:3128",
+        )
+
+
+class TestS3ClientCache(ServiceTestCase):
+    def test_clients_are_reused_per_endpoint_and_credentials(self):
+        cache = self.stac_io.S3ClientCache()
+        settings = {
+            "endpoint_url": "https://s3.example.com",
+            "region_name": "us-east-1",
+            "aws_access_key_id": "key",
+            "aws_secret_access_key": "secret",
+            "proxies": {"https": "http://proxy:3128"},
+        }
+
+        with mock.patch.dict(os.environ, {"NO_PROXY": "", "no_proxy": ""}):
+            client = cache.get_client(**settings)
+            self.assertIs(cache.get_client(**settings), client)
+            self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "clients": 1})
+
+            for changed in (
+                {"aws_access_key_id": "other-key"},
+                {"aws_secret_access_key": "other-secret"},
+                {"proxies": {"https": "http://other-proxy:3128"}},
+            ):
+                self.assertIsNot(cache.get_client(**{**settings, **changed}), client)
+            self.assertIs(cache.get_client(**settings), client)
+
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 4, "clients": 4})
@@ -0,0 +1,128 @@
+import importlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+from tests import ServiceTestCase
+
+
+def fake_execute(conf, inputs, outputs):
+    service = importlib.import_module("tests.water_bodies.service")
+    if inputs["value"] == "invalid":
+        # as the handler reports failures, through the zoo module of the worker
+        conf["lenv"]["message"] = service.zoo._("Invalid inputs:\nstac_items: cannot read item")
+        return service.zoo.SERVICE_FAILED
+    if inputs["value"] == "environ":
+        outputs["stac"]["value"] = os.environ.get("SERVICES_NAMESPACE", "")
+        return service.zoo.SERVICE_SUCCEEDED
+    service.zoo.update_status(conf, 50)
+    outputs["stac"]["value"] = f"{inputs['value']} from {os.getpid()}"
+    conf["lenv"]["message"] = "done"
+    return service.zoo.SERVICE_SUCCEEDED
+
+
+def fake_execute_batch(conf, input_sets, outputs):
+    service = importlib.import_module("tests.water_bodies.service")
+    outputs["stac"]["value"] = f"{len(input_sets)} from {os.getpid()}"
+    return service.zoo.SERVICE_SUCCEEDED
+
+
+def run_pool(socket_path):
+    handler = importlib.import_module("tests.water_bodies.handler")
+    worker = importlib.import_module("tests.water_bodies.worker")
+    handler.execute = fake_execute
+    handler.execute_batch = fake_execute_batch
+    worker.serve(socket_path, workers=2, max_jobs=2)
+
+
+class TestWorkerPool(ServiceTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.socket_path = os.path.join(tempfile.mkdtemp(), "worker.sock")
+        cls.pool = multiprocessing.Process(target=run_pool, args=(cls.socket_path,))
+        cls.pool.start()
+        deadline = time.time() + 30
+        while not os.path.exists(cls.socket_path) and time.time() < deadline:
+            time.sleep(0.1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.terminate()
+        cls.pool.join()
+
+    def execute(self, value):
+        conf = {"lenv": {"message": ""}, "eoepca": {"worker_socket": self.socket_path}}
+        outputs = {"stac": {"value": ""}}
+        status = self.service.water_bodies(conf, {"value": value}, outputs)
+        return status, conf, outputs
+
+    def test_execution_is_forwarded(self):
+        progress = []
+        update_status = self.service.zoo.update_status
+        self.service.zoo.update_status = lambda conf, value: progress.append(value)
+        try:
+            status, conf, outputs = self.execute("result")
+        finally:
+            self.service.zoo.update_status = update_status
+
+        self.assertEqual(status, self.service.zoo.SERVICE_SUCCEEDED)
+        self.assertEqual(conf["lenv"]["message"], "done")
+        self.assertTrue(outputs["stac"]["value"].startswith("result from "))
+        self.assertNotEqual(outputs["stac"]["value"], f"result from {os.getpid()}")
+        self.assertEqual(progress, [50])
+
+    def test_batch_is_forwarded(self):
+        conf = {"lenv": {"message": ""}, "eoepca": {"worker_socket": self.socket_path}}
+        outputs = {"stac": {"value": ""}}
+        inputs = {"input_sets": {"value": '[{"stac_items": ["a"]}, {"stac_items": ["b"]}]'}}
+
+        status = self.service.water_bodies_batch(conf, inputs, outputs)
+
+        self.assertEqual(status, self.service.zoo.SERVICE_SUCCEEDED)
+        self.assertTrue(outputs["stac"]["value"].startswith("2 from "))
+        self.assertNotEqual(outputs["stac"]["value"], f"2 from {os.getpid()}")
+
+    def test_workers_are_replaced(self):
+        # more executions than the workers can run before being replaced
+        for i in range(6):
+            status, _, outputs = self.execute(i)
+            self.assertEqual(status, self.service.zoo.SERVICE_SUCCEEDED)
+            self.assertTrue(outputs["stac"]["value"].startswith(f"{i} from "))
+
+    def test_unavailable_pool(self):
+        with self.assertRaises(self.worker.WorkerUnavailable):
+            self.worker.forward(os.path.join(tempfile.mkdtemp(), "missing.sock"), {}, {}, {})
+
+    def test_failure_message(self):
+        status, conf, _ = self.execute("invalid")
+
+        self.assertEqual(status, self.service.zoo.SERVICE_FAILED)
+        self.assertEqual(conf["lenv"]["message"], "Invalid inputs:\nstac_items: cannot read item")
+
+    def test_environment_is_forwarded(self):
+        os.environ["SERVICES_NAMESPACE"] = "eric"
+        try:
+            _, _, outputs = self.execute("environ")
+        finally:
+            del os.environ["SERVICES_NAMESPACE"]
+        self.assertEqual(outputs["stac"]["value"], "eric")
+
+        # the environment of an execution is not left to the next ones of the worker
+        for _ in range(2):
+            _, _, outputs = self.execute("environ")
+            self.assertEqual(outputs["stac"]["value"], "")
+
+    def test_unauthenticated_connection(self):
+        from multiprocessing import AuthenticationError
+        from multiprocessing.connection import Client
+
+        self.assertEqual(os.stat(self.worker.authkey_path(self.socket_path)).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o007, 0)
+
+        with self.assertRaises(AuthenticationError):
+            Client(self.socket_path, family="AF_UNIX", authkey=b"not the key")
+        # the refused connection neither runs an execution nor stops the pool
+        status, _, _ = self.execute("after")
+        self.assertEqual(status, self.service.zoo.SERVICE_SUCCEEDED)
@@ -0,0 +1,98 @@
+import importlib
+import multiprocessing
+import os
+import tempfile
+from unittest import mock
+
+from tests import ServiceTestCase
+
+CREDENTIALS = {"endpoint": "http://s3", "access": "a", "secret": "s", "region": "r", "bucketname": "b"}
+
+
+def record_failures(path, count):
+    handler = importlib.import_module("tests.water_bodies.handler")
+    cache = handler.WorkspaceCredentialCache(path, failure_threshold=1000)
+    for _ in range(count):
+        cache.record_failure()
+
+
+def put_credentials(path):
+    handler = importlib.import_module("tests.water_bodies.handler")
+    handler.WorkspaceCredentialCache(path).put("eric", CREDENTIALS)
+
+
+class TestWorkspaceCredentialCache(ServiceTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "workspace-credentials.json")
+        self.now = 1000.0
+        clock = mock.patch.object(self.handler.time, "time", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def cache(self, **kwargs):
+        return self.handler.WorkspaceCredentialCache(self.path, **kwargs)
+
+    def run_processes(self, target, *args, processes=1):
+        context = multiprocessing.get_context("fork")
+        children = [context.Process(target=target, args=(self.path, *args)) for _ in range(processes)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+
+    def test_ttl(self):
+        cache = self.cache(ttl=300)
+        cache.put("eric", CREDENTIALS)
+
+        self.now += 299
+        self.assertEqual(cache.get("eric"), CREDENTIALS)
+        self.now += 1
+        self.assertIsNone(cache.get("eric"))
+        self.assertIsNone(cache.get("alice"))
+
+    def test_store_is_shared_between_processes(self):
+        self.run_processes(put_credentials)
+
+        # read from the file, the entry is not in the memory of this process
+        self.assertEqual(self.cache().get("eric"), CREDENTIALS)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_store_updates_are_serialized(self):
+        self.run_processes(record_failures, 50, processes=4)
+
+        with self.handler.locked_json_file(self.path) as store:
+            self.assertEqual(store["breaker"]["failures"], 200)
+
+    def test_breaker(self):
+        cache = self.cache(failure_threshold=2, reset_timeout=60)
+
+        cache.record_failure()
+        self.assertTrue(cache.api_available())
+        cache.record_failure()
+        self.assertFalse(cache.api_available())
+
+        # half-open once the timeout passed: one more failure opens it again
+        self.now += 60
+        self.assertTrue(cache.api_available())
+        cache.record_failure()
+        self.assertFalse(cache.api_available())
+
+        # and a success closes it
+        self.now += 60
+        cache.record_success()
+        cache.record_failure()
+        self.assertTrue(cache.api_available())
+
+    def test_invalidation(self):
+        cache = self.cache()
+        cache.put("eric", CREDENTIALS)
+        cache.put("alice", CREDENTIALS)
+
+        cache.invalidate("eric")
+
+        self.assertIsNone(cache.get("eric"))
+        self.assertEqual(cache.get("alice"), CREDENTIALS)
+        # other processes do not find it either
+        self.handler.WorkspaceCredentialCache._memory.clear()
+        self.assertIsNone(self.cache().get("eric"))
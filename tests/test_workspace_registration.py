@@ -0,0 +1,214 @@
+import http.server
+import json
+import tempfile
+import threading
+from unittest import mock
+
+from tests import ServiceTestCase
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Workspace API stub answering with the queued statuses, then 200."""
+
+    protocol_version = "HTTP/1.1"
+    statuses = []
+    requests = []
+
+    def respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.requests.append((self.command, self.path, body))
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = respond
+    do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+class TestWorkspaceRegistrationClient(ServiceTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/workspaces/ws-eric"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Handler.statuses.clear()
+        Handler.requests.clear()
+        self.delays = []
+        sleep = mock.patch.object(self.handler.time, "sleep", self.delays.append)
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def client(self, **kwargs):
+        return self.handler.WorkspaceRegistrationClient(self.url, token="token", **kwargs)
+
+    def test_retries_with_backoff(self):
+        Handler.statuses.extend([429, 503])
+
+        response = self.client(retries=3, backoff=0.5).register("s3://bucket/catalog.json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(Handler.requests), 3)
+        # exponential, with up to as much jitter
+        self.assertEqual(len(self.delays), 2)
+        self.assertTrue(0.5 <= self.delays[0] <= 1.0)
+        self.assertTrue(1.0 <= self.delays[1] <= 2.0)
+
+    def test_retries_exhausted(self):
+        Handler.statuses.extend([502] * 5)
+
+        response = self.client(retries=2, backoff=0.5).register("s3://bucket/catalog.json")
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(len(Handler.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        Handler.statuses.append(404)
+
+        response = self.client().register("s3://bucket/catalog.json")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(Handler.requests), 1)
+        self.assertEqual(self.delays, [])
+
+    def test_register_json_in_chunks(self):
+        collection = {
+            "type": "FeatureCollection",
+            "id": "usid",
+            "features": [{"id": str(i)} for i in range(5)],
+        }
+
+        self.client(chunk_size=2).register_json(json.dumps(collection))
+
+        chunks = [json.loads(body) for _, _, body in Handler.requests]
+        self.assertEqual(
+            {path for _, path, _ in Handler.requests}, {"/workspaces/ws-eric/register-json"}
+        )
+        self.assertEqual(
+            [[feature["id"] for feature in chunk["features"]] for chunk in chunks],
+            [["0", "1"], ["2", "3"], ["4"]],
+        )
+        self.assertEqual({chunk["id"] for chunk in chunks}, {"usid"})
+
+    def test_register_json_stops_at_failed_chunk(self):
+        Handler.statuses.extend([200, 400])
+        collection = {"type": "FeatureCollection", "features": [{"id": str(i)} for i in range(5)]}
+
+        response = self.client(chunk_size=2).register_json(json.dumps(collection))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(Handler.requests), 2)
+
+    def test_small_collection_in_one_request(self):
+        collection_json = json.dumps({"type": "FeatureCollection", "features": [{"id": "0"}]})
+
+        self.client(chunk_size=2).register_json(collection_json)
+
+        self.assertEqual(
+            Handler.requests, [("POST", "/workspaces/ws-eric/register-json", collection_json.encode())]
+        )
+
+    def test_wait_for_collection(self):
+        Handler.statuses.extend([404, 404])
+
+        self.assertTrue(self.client().wait_for_collection("usid", deadline=60, interval=2))
+        self.assertEqual(
+            [path for _, path, _ in Handler.requests], ["/workspaces/ws-eric/collections/usid"] * 3
+        )
+        self.assertEqual(self.delays, [2, 2])
+
+    def test_wait_for_collection_in_catalog(self):
+        catalog_url = f"http://127.0.0.1:{self.server.server_port}/catalogs/ws-eric"
+
+        self.assertTrue(self.client(catalog_endpoint=catalog_url).wait_for_collection("usid"))
+        self.assertEqual(
+            [path for _, path, _ in Handler.requests], ["/catalogs/ws-eric/collections/usid"]
+        )
+
+    def test_unavailable_collection_is_reported(self):
+        workspace_url = f"http://127.0.0.1:{self.server.server_port}"
+        conf = {
+            "lenv": {"Identifier": "water-bodies", "usid": "usid"},
+            "main": {"tmpPath": tempfile.mkdtemp()},
+            "eoepca": {
+                "workspace_url": workspace_url,
+                "workspace_prefix": "ws",
+                "workspace_catalog_url": workspace_url + "/catalogs/{workspace}",
+                "workspace_readiness_deadline": "10",
+            },
+        }
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf)
+        execution_handler.username = "eric"
+        execution_handler.feature_collection = json.dumps({"type": "FeatureCollection", "features": []})
+        Handler.statuses.extend([200, 200] + [404] * 100)
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        with mock.patch.object(self.handler.time, "monotonic", lambda: now[0]), mock.patch.object(
+            self.handler.time, "sleep", sleep
+        ), mock.patch.object(self.handler.logger, "warning") as warning:
+            execution_handler.register_outputs("s3://bucket/catalog.json", "usid")
+
+        self.assertIn("Collection usid not available", warning.call_args.args[0])
+        self.assertEqual(
+            {path for _, path, _ in Handler.requests[2:]}, {"/catalogs/ws-eric/collections/usid"}
+        )
+
+    def test_items_are_registered_without_crawl(self):
+        conf = {
+            "lenv": {"Identifier": "water-bodies", "usid": "usid"},
+            "main": {"tmpPath": tempfile.mkdtemp()},
+            "eoepca": {
+                "workspace_url": f"http://127.0.0.1:{self.server.server_port}",
+                "workspace_prefix": "ws",
+            },
+        }
+        execution_handler = self.handler.EoepcaCalrissianRunnerExecutionHandler(conf=conf)
+        execution_handler.username = "eric"
+        execution_handler.feature_collection = json.dumps({"type": "Collection", "id": "usid"})
+        items = json.dumps({"type": "FeatureCollection", "features": [{"id": "item"}], "id": "usid"})
+
+        execution_handler.register_outputs("s3://bucket/catalog.json", "usid", items=items)
+
+        # the collection, then its items, and no crawl of the catalog
+        self.assertEqual(
+            [(path, body) for _, path, body in Handler.requests],
+            [
+                ("/workspaces/ws-eric/register-json", execution_handler.feature_collection.encode()),
+                ("/workspaces/ws-eric/register-json", items.encode()),
+            ],
+        )
+
+    def test_wait_for_collection_deadline(self):
+        Handler.statuses.extend([404] * 100)
+        now = [0.0]
+
+        def sleep(seconds):
+            self.delays.append(seconds)
+            now[0] += seconds + 1
+
+        # each poll takes a second
+        with mock.patch.object(self.handler.time, "monotonic", lambda: now[0]), mock.patch.object(
+            self.handler.time, "sleep", sleep
+        ):
+            self.assertFalse(self.client().wait_for_collection("usid", deadline=10, interval=2))
+
+        # polled at 0, 3, 6 and 9 seconds, and a last time after sleeping the second left
+        self.assertEqual(len(Handler.requests), 5)
+        self.assertEqual(self.delays, [2, 2, 2, 1])
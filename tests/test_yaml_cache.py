@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+from tests import ServiceTestCase
+
+
+class TestYamlCache(ServiceTestCase):
+    def write(self, content):
+        path = os.path.join(tempfile.mkdtemp(), "document.yaml")
+        with open(path, "w") as stream:
+            stream.write(content)
+        return path
+
+    def test_parsed_document_is_cached(self):
+        path = self.write("a: 1\n")
+
+        self.assertEqual(self.handler.load_yaml_cached(path), {"a": 1})
+        self.assertTrue(os.path.exists(f"{path}.cache"))
+
+        # another process starts from the pickled copy
+        self.handler._parsed_documents.pop(path)
+        self.assertEqual(self.handler.load_yaml_cached(path), {"a": 1})
+
+    def test_secrets_are_not_written_to_disk(self):
+        path = self.write("auths:\n  registry: secret\n")
+
+        self.assertEqual(
+            self.handler.load_yaml_cached(path, disk_cache=False), {"auths": {"registry": "secret"}}
+        )
+        self.assertEqual(
+            self.handler.load_yaml_cached(path, disk_cache=False), {"auths": {"registry": "secret"}}
+        )
+        self.assertEqual(os.listdir(os.path.dirname(path)), ["document.yaml"])
@@ -0,0 +1,1912 @@
+# execution handler of the service, run by the entry function of service.py
+# in process or by the warm workers of worker.py
+import fcntl
+import functools
+import hashlib
+import io
+import json
+import os
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import zoo_calrissian_runner
+from loguru import logger
+from pycalrissian.execution import CalrissianExecution
+from zoo_calrissian_runner import ExecutionHandler, ZooCalrissianRunner
+
+from .service import zoo
+
+# For DEBUG
+import traceback
+
+# optional fast JSON encoder for the compact output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# boto3/botocore, pystac, requests, jwt and yaml are imported by the code paths
+# that need them, keeping them out of the start-up of every execution
+
+
+# parsed YAML documents as pickles, by path: (mtime_ns, size, sha256, pickle)
+_parsed_documents = {}
+
+
+def load_yaml_cached(path, disk_cache=True):
+    """
+    Load a YAML document, reusing a previously parsed copy while the file is unchanged.
+
+    The parsed document is kept in memory and pickled to `<path>.cache` next to the
+    source file. A matching mtime and size costs only a stat, otherwise the content
+    hash decides whether the document has to be parsed again.
+
+    :param path: the YAML file to load
+    :param disk_cache: False to keep the parsed document in memory only, for secrets
+    """
+    stat = os.stat(path)
+    cache_path = f"{path}.cache"
+
+    entry = _parsed_documents.get(path)
+    if entry is None and disk_cache:
+        try:
+            with open(cache_path, "rb") as stream:
+                entry = pickle.load(stream)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            entry = None
+
+    if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+        with open(path, "rb") as stream:
+            content = stream.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if entry is None or entry[2] != digest:
+            import yaml
+
+            try:
+                from yaml import CSafeLoader as YamlLoader
+            except ImportError:
+                from yaml import SafeLoader as YamlLoader
+
+            document = pickle.dumps(
+                yaml.load(content, Loader=YamlLoader), protocol=pickle.HIGHEST_PROTOCOL
+            )
+        else:
+            document = entry[3]
+        entry = (stat.st_mtime_ns, stat.st_size, digest, document)
+        if disk_cache:
+            try:
+                tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as stream:
+                    pickle.dump(entry, stream, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                logger.debug(f"Unable to write the parsed document cache {cache_path}: {e}")
+
+    _parsed_documents[path] = entry
+    # callers get their own copy, free to modify it
+    return pickle.loads(entry[3])
+
+
+def dumps_compact(document):
+    """Serialize a document to JSON without whitespace, with orjson when installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(document).decode("utf-8")
+        except TypeError:
+            # e.g. integers beyond 64 bits, which json handles
+            pass
+    return json.dumps(document, separators=(",", ":"))
+
+
+def dump_feature_collection(features, collection_id, compact=False):
+    """
+    Serialize features into a FeatureCollection JSON document, one at a time.
+
+    The output is the one of json.dumps(..., indent=2) on the whole collection
+    dict, or of dumps_compact when compact, without ever building that dict.
+
+    :param features: iterable of feature dicts
+    :param collection_id: id of the collection
+    :param compact: serialize without whitespace
+    """
+    stream = io.StringIO()
+    if compact:
+        stream.write('{"type":"FeatureCollection","features":[')
+        separator = ""
+        for feature in features:
+            stream.write(separator)
+            stream.write(dumps_compact(feature))
+            separator = ","
+        stream.write('],"id":' + dumps_compact(collection_id) + "}")
+        return stream.getvalue()
+
+    stream.write('{\n  "type": "FeatureCollection",\n  "features": [')
+    separator = "\n    "
+    for feature in features:
+        stream.write(separator)
+        stream.write(json.dumps(feature, indent=2).replace("\n", "\n    "))
+        separator = ",\n    "
+    stream.write("],\n" if separator == "\n    " else "\n  ],\n")
+    stream.write('  "id": ' + json.dumps(collection_id) + "\n}")
+    return stream.getvalue()
+
+
+class ExecutionTimer:
+    """
+    Records the duration of the phases of an execution as nested spans.
+
+    Spans can carry counters such as items or bytes and are written as a JSON
+    record, so the time of a job can be broken down after the fact.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._stack = []
+
+    @contextmanager
+    def span(self, name, **counters):
+        """Time the enclosed block, the yielded record takes extra counters."""
+        record = {
+            "name": "/".join(self._stack + [name]),
+            "start": round(time.perf_counter() - self.origin, 6),
+            **counters,
+        }
+        self.spans.append(record)
+        self._stack.append(name)
+        try:
+            yield record
+        finally:
+            self._stack.pop()
+            record["duration"] = round(time.perf_counter() - self.origin - record["start"], 6)
+
+    def write(self, path, **metadata):
+        with open(path, "w") as stream:
+            json.dump({**metadata, "started": self.started, "spans": self.spans}, stream, indent=2)
+
+
+def timed(name):
+    """Time a method of the execution handler as a span of its timer."""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.timer.span(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def locked_json_file(path):
+    """
+    Yield a JSON document shared between processes, then write it back.
+
+    The file is locked for the duration of the block and replaced atomically,
+    readable by the owner only. A missing or unreadable file yields {}.
+    """
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path, "r") as stream:
+                    document = json.load(stream)
+            except (FileNotFoundError, ValueError):
+                document = {}
+            yield document
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as stream:
+                json.dump(document, stream)
+            os.replace(tmp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class InputValidationError(Exception):
+    """
+    Raised when the inputs of an execution cannot be processed, with the reason
+    reported to the user.
+    """
+
+
+def input_values(inputs, name):
+    """The values of an input as a list, empty when the input is not given."""
+    value = inputs.get(name)
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value is None or value == "":
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [v.strip() if isinstance(v, str) else v for v in values]
+
+
+def check_stac_inputs(inputs, stac_io, max_workers=10):
+    """
+    Check that the STAC items of the inputs can be processed, before any pod is scheduled.
+
+    The items of `stac_items` are read concurrently, then each must have an asset
+    for every requested band (by key, or by eo:bands name or common name) and a
+    bbox intersecting the `aoi`. The AOI is only compared when it is given in
+    EPSG:4326, the CRS of item bboxes.
+
+    :param inputs: the inputs of the execution
+    :param stac_io: the StacIO used to read the items
+    :param max_workers: maximum number of concurrent reads
+    :raises InputValidationError: with one line per problem found
+    """
+    hrefs = input_values(inputs, "stac_items")
+    if not hrefs:
+        return
+    bands = input_values(inputs, "bands")
+    epsgs = input_values(inputs, "epsg")
+
+    errors = []
+    aoi = None
+    aoi_values = input_values(inputs, "aoi")
+    if aoi_values:
+        try:
+            aoi = [float(v) for v in str(aoi_values[0]).split(",")]
+        except ValueError:
+            aoi = []
+        if len(aoi) != 4:
+            errors.append(f"aoi '{aoi_values[0]}' is not a bounding box 'min_x,min_y,max_x,max_y'")
+            aoi = None
+        elif epsgs and str(epsgs[0]).upper() not in ("EPSG:4326", "4326"):
+            aoi = None
+
+    def read(href):
+        try:
+            return stac_io.read_json(href), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(hrefs)))) as executor:
+        documents = list(executor.map(read, hrefs))
+
+    for href, (document, error) in zip(hrefs, documents):
+        if error is not None:
+            errors.append(f"stac_items: cannot read {href}: {error}")
+            continue
+        assets = document.get("assets") or {}
+        if bands:
+            names = set(assets)
+            for asset in assets.values():
+                for band in asset.get("eo:bands") or []:
+                    names.update(band.get(field) for field in ("name", "common_name") if band.get(field))
+            missing = [band for band in bands if band not in names]
+            if missing:
+                errors.append(
+                    f"stac_items: {href} has no asset for the bands {', '.join(missing)} "
+                    f"(assets: {', '.join(sorted(assets))})"
+                )
+        bbox = document.get("bbox")
+        if aoi is not None and bbox:
+            # 3D bboxes are [min_x, min_y, min_z, max_x, max_y, max_z]
+            item_bbox = [bbox[0], bbox[1], bbox[3], bbox[4]] if len(bbox) == 6 else bbox
+            if (
+                aoi[0] > item_bbox[2]
+                or aoi[2] < item_bbox[0]
+                or aoi[1] > item_bbox[3]
+                or aoi[3] < item_bbox[1]
+            ):
+                errors.append(
+                    f"stac_items: {href} with bbox {item_bbox} does not intersect the aoi {aoi}"
+                )
+
+    if errors:
+        raise InputValidationError("\n".join(errors))
+
+
+class WorkspaceCredentialCache:
+    """
+    Per-user cache of the storage credentials returned by the Workspace API.
+
+    Entries are kept in memory and in a JSON file guarded by an exclusive file
+    lock, so that separate ZOO worker processes share their lookups. The same
+    file holds the state of a circuit breaker: after `failure_threshold`
+    consecutive failures the API is considered unhealthy for `reset_timeout`
+    seconds and callers go straight to the pre-configured storage.
+    """
+
+    _memory = {}
+    _memory_lock = threading.Lock()
+
+    def __init__(self, path, ttl=300, failure_threshold=3, reset_timeout=60):
+        self.path = path
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    @contextmanager
+    def _locked_store(self):
+        with locked_json_file(self.path) as store:
+            store.setdefault("credentials", {})
+            store.setdefault("breaker", {"failures": 0, "open_until": 0})
+            yield store
+
+    def get(self, username):
+        """Return the cached credentials of a user, or None if missing or expired."""
+        now = time.time()
+        with self._memory_lock:
+            entry = self._memory.get((self.path, username))
+        if entry is None:
+            with self._locked_store() as store:
+                entry = store["credentials"].get(username)
+            if entry is not None:
+                with self._memory_lock:
+                    self._memory[(self.path, username)] = entry
+        if entry is None or entry["expires"] <= now:
+            return None
+        return entry["credentials"]
+
+    def put(self, username, credentials):
+        entry = {"credentials": credentials, "expires": time.time() + self.ttl}
+        with self._memory_lock:
+            self._memory[(self.path, username)] = entry
+        with self._locked_store() as store:
+            store["credentials"][username] = entry
+
+    def invalidate(self, username):
+        logger.info(f"Invalidating cached workspace credentials of {username}")
+        with self._memory_lock:
+            self._memory.pop((self.path, username), None)
+        with self._locked_store() as store:
+            store["credentials"].pop(username, None)
+
+    def api_available(self):
+        """False while the circuit breaker is open."""
+        with self._locked_store() as store:
+            return store["breaker"]["open_until"] <= time.time()
+
+    def record_success(self):
+        with self._locked_store() as store:
+            store["breaker"] = {"failures": 0, "open_until": 0}
+
+    def record_failure(self):
+        with self._locked_store() as store:
+            breaker = store["breaker"]
+            breaker["failures"] += 1
+            if breaker["failures"] >= self.failure_threshold:
+                breaker["open_until"] = time.time() + self.reset_timeout
+                logger.warning(f"Workspace API marked unhealthy for {self.reset_timeout} seconds")
+
+
+class WorkspaceRegistrationClient:
+    """
+    Registers processing results with the Workspace API of a user.
+
+    Requests go through a persistent session with a timeout and are retried with
+    exponential backoff and jitter on connection errors, 429 and 5xx responses.
+    Large feature collections are registered in chunks of `chunk_size` features.
+    The collections are looked up in the STAC catalog at `catalog_endpoint`, by
+    default the Workspace API itself.
+    """
+
+    def __init__(
+        self,
+        api_endpoint,
+        token=None,
+        timeout=10,
+        retries=3,
+        backoff=0.5,
+        chunk_size=1000,
+        proxies=None,
+        catalog_endpoint=None,
+    ):
+        import requests
+
+        self.api_endpoint = api_endpoint
+        self.catalog_endpoint = catalog_endpoint or api_endpoint
+        self.proxies = proxies
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        self.session.headers["Accept"] = "application/json"
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def request(self, method, path, **kwargs):
+        import requests
+
+        url = f"{self.api_endpoint}/{path}"
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.timeout, proxies=self.proxies, **kwargs
+                )
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code}")
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"{method} {url} failed: {e}")
+            if attempt < self.retries:
+                delay = self.backoff * 2**attempt
+                time.sleep(delay + random.uniform(0, delay))
+        return response
+
+    def register_json(self, collection_json):
+        """Register a STAC collection or feature collection, given as a JSON string."""
+        collection = json.loads(collection_json)
+        features = collection.get("features")
+        if features is None or len(features) <= self.chunk_size:
+            return self.request(
+                "POST",
+                "register-json",
+                data=collection_json.encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+            )
+
+        logger.info(f"Register {len(features)} features in chunks of {self.chunk_size}")
+        for start in range(0, len(features), self.chunk_size):
+            response = self.request(
+                "POST",
+                "register-json",
+                json={**collection, "features": features[start : start + self.chunk_size]},
+            )
+            if not response.ok:
+                break
+        return response
+
+    def register(self, url):
+        """Ask the workspace to crawl and register the STAC catalog at url."""
+        return self.request("POST", "register", json={"type": "stac-item", "url": url})
+
+    def wait_for_collection(self, collection_id, deadline=60, interval=2):
+        """
+        Poll the workspace catalog until it serves the collection.
+
+        Returns True once the collection is available, False when the deadline
+        (in seconds) passes first.
+        """
+        import requests
+
+        expiry = time.monotonic() + deadline
+        while True:
+            try:
+                response = self.session.get(
+                    f"{self.catalog_endpoint}/collections/{collection_id}",
+                    timeout=self.timeout,
+                    proxies=self.proxies,
+                )
+                if response.ok:
+                    return True
+                logger.info(f"Collection {collection_id} not available yet: {response.status_code}")
+            except requests.RequestException as e:
+                logger.info(f"Collection {collection_id} not available yet: {e}")
+            remaining = expiry - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+
+
+class LocalResultStore:
+    """Keeps the feature collections of memoized executions as files in a directory."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._file(key), "r") as stream:
+                return stream.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as stream:
+            stream.write(text)
+        os.replace(tmp_path, self._file(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3ResultStore:
+    """
+    Keeps the feature collections of memoized executions as objects under an s3:// prefix.
+    """
+
+    def __init__(
+        self,
+        url,
+        endpoint_url=None,
+        region_name=None,
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        proxies=None,
+    ):
+        from urllib.parse import urlparse
+
+        from .stac_io import s3_client_cache
+
+        parsed = urlparse(url)
+        self.bucket = parsed.netloc
+        self.prefix = parsed.path.strip("/")
+        self.s3_client = s3_client_cache.get_client(
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            proxies=proxies,
+        )
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}.json" if self.prefix else f"{key}.json"
+
+    def get(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return (
+                self.s3_client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+                .read()
+                .decode("utf-8")
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, key, text):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=text.encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    def delete(self, key):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+class ExecutionMemo:
+    """
+    Results of successful executions, by a key of their user, inputs and app-package.
+
+    The index is a JSON file shared by the executions on the host, locked while
+    it is updated, and the feature collections are kept in a store (a
+    LocalResultStore or S3ResultStore). Entries older than `max_age` seconds are
+    dropped, and the least recently used ones are evicted once the stored
+    feature collections exceed `max_bytes`.
+    """
+
+    def __init__(self, path, store, max_age=7 * 24 * 3600, max_bytes=1024 * 1024 * 1024):
+        self.path = path
+        self.store = store
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(username, inputs, app_package_path):
+        """
+        The key of an execution: its user, the values of its inputs and the content of
+        the application package.
+        """
+        with open(app_package_path, "rb") as stream:
+            app_package_digest = hashlib.sha256(stream.read()).hexdigest()
+
+        def normalize(value):
+            if isinstance(value, str):
+                return value.strip()
+            if isinstance(value, list):
+                return [normalize(v) for v in value]
+            return value
+
+        values = {
+            name: normalize(value.get("value") if isinstance(value, dict) else value)
+            for name, value in inputs.items()
+        }
+        document = json.dumps([username, values, app_package_digest], sort_keys=True, default=str)
+        return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _locked_index(self):
+        with locked_json_file(self.path) as index:
+            yield index
+            self._evict(index)
+
+    def _evict(self, index):
+        now = time.time()
+        expired = [key for key, entry in index.items() if entry["created"] + self.max_age <= now]
+        total = sum(entry["size"] for key, entry in index.items() if key not in expired)
+        evicted = []
+        for key, entry in sorted(index.items(), key=lambda pair: pair[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            if key not in expired:
+                evicted.append(key)
+                total -= entry["size"]
+        for key in expired + evicted:
+            del index[key]
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"Could not delete memoized result {key}: {e}")
+
+    def lookup(self, key):
+        """Return the entry and feature collection of a prior execution, or None."""
+        with self._locked_index() as index:
+            entry = index.get(key)
+            if entry is None or entry["created"] + self.max_age <= time.time():
+                return None
+            feature_collection = self.store.get(key)
+            if feature_collection is None:
+                del index[key]
+                return None
+            entry["used"] = time.time()
+            return dict(entry), feature_collection
+
+    def record(self, key, feature_collection, catalog_uri):
+        self.store.put(key, feature_collection)
+        now = time.time()
+        with self._locked_index() as index:
+            index[key] = {
+                "catalog_uri": catalog_uri,
+                "size": len(feature_collection),
+                "created": now,
+                "used": now,
+            }
+
+    def discard(self, key):
+        with self._locked_index() as index:
+            index.pop(key, None)
+        self.store.delete(key)
+
+
+def wait_for_completion(
+    is_complete,
+    job_events=None,
+    stalled=None,
+    wall_time=None,
+    min_interval=1.0,
+    max_interval=30.0,
+    backoff=2.0,
+    clock=time.monotonic,
+    sleep=time.sleep,
+):
+    """
+    Wait for a job to complete, woken up by the events of a watch on it.
+
+    Without a watch, or once it fails, the job is polled with an interval growing
+    from `min_interval` to `max_interval` by `backoff`, so that short jobs are
+    seen complete soon after they finish and long ones cost few requests.
+
+    :param is_complete: callable telling whether the job is complete
+    :param job_events: callable returning the events of the job for up to the
+        given number of seconds, events carry the job as "object"
+    :param stalled: callable given the elapsed seconds, True to stop waiting
+    :param wall_time: maximum number of seconds to wait, None for no limit
+    :return: True if the job completed, False if waiting stopped before
+    """
+    start = clock()
+    interval = min_interval
+    while not is_complete():
+        elapsed = clock() - start
+        if wall_time is not None and elapsed >= wall_time:
+            logger.warning(f"Job not complete after the wall time of {wall_time} seconds")
+            return False
+        if stalled is not None and stalled(elapsed):
+            return False
+        timeout = max_interval if wall_time is None else max(1, min(max_interval, wall_time - elapsed))
+
+        if job_events is not None:
+            try:
+                for event in job_events(timeout):
+                    status = getattr(event["object"], "status", None)
+                    if status is not None and (status.succeeded or status.failed):
+                        break
+                continue
+            except Exception as e:
+                logger.warning(f"Watch on the job failed, polling it instead: {e}")
+                job_events = None
+
+        sleep(min(interval, timeout))
+        interval = min(interval * backoff, max_interval)
+    return True
+
+
+class WatchedCalrissianExecution(CalrissianExecution):
+    """
+    CalrissianExecution seeing the completion of its job from a watch on it.
+
+    The job is watched through the Kubernetes API and, when watching is not
+    possible (e.g. not allowed), polled with back-off by wait_for_completion.
+    """
+
+    def __init__(self, job, runtime_context, min_interval=1.0, backoff=2.0, watch=True):
+        super().__init__(job=job, runtime_context=runtime_context)
+        self.min_interval = min_interval
+        self.backoff = backoff
+        self.watch = watch
+
+    def job_events(self, timeout):
+        from kubernetes import watch
+
+        job_watch = watch.Watch()
+        try:
+            yield from job_watch.stream(
+                self.runtime_context.batch_v1_api.list_namespaced_job,
+                namespace=self.runtime_context.namespace,
+                field_selector=f"metadata.name={self.namespaced_job_name}",
+                timeout_seconds=int(timeout),
+            )
+        finally:
+            job_watch.stop()
+
+    def kill(self, reason):
+        logger.warning(reason)
+        self.killed = True
+        self.runtime_context.batch_v1_api.delete_namespaced_job(
+            namespace=self.runtime_context.namespace, name=self.namespaced_job_name
+        )
+
+    def monitor(self, interval=5, grace_period=120, wall_time=None):
+        if not self.is_active():
+            logger.warning("job is not submitted")
+            return
+
+        def stalled(elapsed):
+            if elapsed > grace_period and self.get_waiting_pods():
+                self.kill("found pods in waiting status with reason ImagePullBackOff, killing job")
+                return True
+            return False
+
+        completed = wait_for_completion(
+            self.is_complete,
+            job_events=self.job_events if self.watch else None,
+            stalled=stalled,
+            wall_time=wall_time,
+            min_interval=min(self.min_interval, interval),
+            max_interval=interval,
+            backoff=self.backoff,
+        )
+        if not completed and not self.killed:
+            self.kill("reached wall time for execution, killing job")
+
+
+class EoepcaCalrissianRunner(ZooCalrissianRunner):
+    """
+    ZooCalrissianRunner seeing the completion of its job from a watch on it.
+
+    The runner creates a CalrissianExecution for its job; with `job_completion`
+    set to "watch" in the execution handler, it is replaced by a
+    WatchedCalrissianExecution of the same job before being submitted.
+    """
+
+    _execution = None
+
+    @property
+    def execution(self):
+        return self._execution
+
+    @execution.setter
+    def execution(self, execution):
+        if self.handler.job_completion == "watch" and not isinstance(
+            execution, WatchedCalrissianExecution
+        ):
+            execution = WatchedCalrissianExecution(
+                job=execution.job,
+                runtime_context=execution.runtime_context,
+                min_interval=self.handler.job_poll_min_interval,
+            )
+        self._execution = execution
+
+
+class EoepcaCalrissianRunnerExecutionHandler(ExecutionHandler):
+    def __init__(self, conf, inputs=None, timer=None):
+        super().__init__()
+        self.conf = conf
+        self.inputs = inputs
+        self.timer = timer or ExecutionTimer()
+
+        # the HTTP proxy is bypassed for the Workspace API and S3 requests; this is done
+        # per request rather than in os.environ, which is left to the rest of the process.
+        # Executions still change the working directory of the process, where the runner
+        # writes its files, so each runs in a process of its own (see worker.py)
+        self.requests_proxies = {"http": None}
+        self.s3_proxies = {"https": os.environ["HTTPS_PROXY"]} if os.environ.get("HTTPS_PROXY") else {}
+
+        eoepca = self.conf.get("eoepca", {})
+        self.domain = eoepca.get("domain", "")
+        self.workspace_url = eoepca.get("workspace_url", "")
+        self.workspace_prefix = eoepca.get("workspace_prefix", "")
+        if self.workspace_url and self.workspace_prefix:
+            self.use_workspace = True
+        else:
+            self.use_workspace = False
+
+        self.username = None
+        self.identity_resolved = False
+        auth_env = self.conf.get("auth_env", {})
+        self.ades_rx_token = auth_env.get("jwt", "")
+
+        self.feature_collection = None
+        self.output_items = 0
+        # the output catalog of the execution, once its feature collection is built
+        self.catalog_uri = None
+        # the members of a batch return the feature collection of their items to the
+        # batch, which registers them all at once, rather than registering them
+        self.batch_member = False
+
+        # optional profiling of the execution: "cprofile" or "pyinstrument"
+        self.profiler = eoepca.get("profiler", "")
+
+        # Workspace API lookups: request timeout, credential cache and circuit breaker
+        self.workspace_timeout = float(eoepca.get("workspace_timeout", 10))
+        # registration of the results: retries, bulk chunk size and readiness polling
+        self.workspace_retries = int(eoepca.get("workspace_retries", 3))
+        self.workspace_register_chunk_size = int(eoepca.get("workspace_register_chunk_size", 1000))
+        self.workspace_readiness_deadline = float(eoepca.get("workspace_readiness_deadline", 0))
+        self.workspace_readiness_interval = float(eoepca.get("workspace_readiness_interval", 2))
+        # the STAC catalog serving the registered collections, where {workspace}
+        # stands for the workspace of the user; the Workspace API when unset
+        self.workspace_catalog_url = eoepca.get("workspace_catalog_url", "")
+        self.credential_cache = WorkspaceCredentialCache(
+            os.path.join(self.conf.get("main", {}).get("tmpPath", "/tmp"), "workspace-credentials.json"),
+            ttl=float(eoepca.get("workspace_credentials_ttl", 300)),
+            failure_threshold=int(eoepca.get("workspace_breaker_threshold", 3)),
+            reset_timeout=float(eoepca.get("workspace_breaker_reset", 60)),
+        )
+
+        # completion of the job: "watch" for a watch on it, with polling as fallback,
+        # or "poll" for the polling of the runner; intervals in seconds
+        self.job_completion = eoepca.get("job_completion", "watch")
+        self.monitor_interval = (
+            int(eoepca["monitor_interval"]) if eoepca.get("monitor_interval") else None
+        )
+        self.job_poll_min_interval = float(eoepca.get("job_poll_min_interval", 1))
+
+        # concurrent reads when walking the output catalog, 1 reads it sequentially
+        self.stac_read_concurrency = int(eoepca.get("stac_read_concurrency", 10))
+
+        # connection pool settings of the shared S3 clients, None keeps the defaults
+        self.s3_max_pool_connections = eoepca.get("s3_max_pool_connections")
+        self.s3_tcp_keepalive = eoepca.get("s3_tcp_keepalive")
+
+        # the feature collection output: compact JSON, and the size (in characters) beyond
+        # which it is returned as a reference to a file under tmpPath rather than inline
+        self.output_compact = str(eoepca.get("output_compact", "false")).lower() == "true"
+        self.output_inline_max_size = (
+            int(eoepca["output_inline_max_size"]) if eoepca.get("output_inline_max_size") else None
+        )
+
+        # checks of the input STAC items before the execution, and their concurrent reads
+        self.preflight = str(eoepca.get("preflight", "true")).lower() == "true"
+        self.preflight_concurrency = int(eoepca.get("preflight_concurrency", 10))
+        self.inputs_checked = False
+
+        # stage-in of the assets of the requested bands and of the always included
+        # ones only, off unless enabled
+        self.stagein_select_assets = str(eoepca.get("stagein_select_assets", "false")).lower() == "true"
+        self.stagein_always_include = [
+            name.strip()
+            for name in eoepca.get(
+                "stagein_always_include", "metadata,granule_metadata,tileinfo_metadata,product_metadata"
+            ).split(",")
+            if name.strip()
+        ]
+
+        # stage-in of the part of cloud-optimized rasters around the aoi, with a margin
+        # in pixels, off unless enabled
+        self.stagein_aoi_window = str(eoepca.get("stagein_aoi_window", "false")).lower() == "true"
+        self.stagein_aoi_margin = int(eoepca.get("stagein_aoi_margin", 32))
+
+        # keep-alive sessions of the STAC documents read over http(s), None keeps the
+        # defaults of requests
+        self.http_pool_maxsize = eoepca.get("http_pool_maxsize")
+        self.http_connect_timeout = eoepca.get("http_connect_timeout")
+        self.http_read_timeout = eoepca.get("http_read_timeout")
+        self.http_retries = eoepca.get("http_retries")
+        self.http_backoff = eoepca.get("http_backoff")
+        self.http_gzip = eoepca.get("http_gzip")
+
+        # disk cache of the STAC documents read, off unless enabled
+        self.stac_cache_dir = None
+        if str(eoepca.get("stac_cache", "false")).lower() == "true":
+            self.stac_cache_dir = eoepca.get("stac_cache_dir") or os.path.join(
+                self.conf.get("main", {}).get("tmpPath", "/tmp"), "stac-cache"
+            )
+        self.stac_cache_max_age = eoepca.get("stac_cache_max_age")
+        self.stac_cache_max_bytes = eoepca.get("stac_cache_max_bytes")
+
+        self.init_config_defaults(self.conf)
+
+        # conversion of the raster outputs to cloud-optimized GeoTIFFs by stage-out
+        self.conf["additional_parameters"]["STAGEOUT_COG"] = str(
+            eoepca.get("stageout_cog", "false")
+        ).lower()
+
+        # memoization of the results of identical executions, off unless enabled; the
+        # results are kept on the host or, with memoize_store set to an s3:// URL, in
+        # the pre-configured stage-out storage
+        self.memo = None
+        if str(eoepca.get("memoize", "false")).lower() == "true":
+            tmp_path = self.conf.get("main", {}).get("tmpPath", "/tmp")
+            store_url = eoepca.get("memoize_store", "")
+            if store_url.startswith("s3://"):
+                additional_parameters = self.conf["additional_parameters"]
+                store = S3ResultStore(
+                    store_url,
+                    endpoint_url=additional_parameters["STAGEOUT_AWS_SERVICEURL"],
+                    region_name=additional_parameters["STAGEOUT_AWS_REGION"],
+                    aws_access_key_id=additional_parameters["STAGEOUT_AWS_ACCESS_KEY_ID"],
+                    aws_secret_access_key=additional_parameters["STAGEOUT_AWS_SECRET_ACCESS_KEY"],
+                    proxies=self.s3_proxies,
+                )
+            else:
+                store = LocalResultStore(store_url or os.path.join(tmp_path, "execution-results"))
+            self.memo = ExecutionMemo(
+                os.path.join(tmp_path, "execution-memo.json"),
+                store,
+                max_age=float(eoepca.get("memoize_max_age", 7 * 24 * 3600)),
+                max_bytes=int(eoepca.get("memoize_max_bytes", 1024 * 1024 * 1024)),
+            )
+
+    @timed("pre_execution_hook")
+    def pre_execution_hook(self):
+        try:
+            logger.info("Pre execution hook")
+
+            # DEBUG
+            # logger.info(f"zzz PRE-HOOK - config...\n{json.dumps(self.conf, indent=2)}\n")
+
+            # bad inputs fail the execution here, before the cluster does any work
+            if self.preflight and self.inputs is not None and not self.inputs_checked:
+                self.check_inputs()
+
+            # the user and the stage-out storage, resolved once for a whole batch
+            if not self.identity_resolved:
+                self.resolve_identity()
+
+            self.conf["additional_parameters"]["STAGEIN_ASSETS"] = ",".join(self.stagein_assets())
+            self.conf["additional_parameters"].update(self.stagein_aoi())
+
+            lenv = self.conf.get("lenv", {})
+            self.conf["additional_parameters"]["collection_id"] = lenv.get("usid", "")
+            self.conf["additional_parameters"]["process"] = os.path.join("processing-results", self.conf["additional_parameters"]["collection_id"])
+
+        except InputValidationError:
+            raise
+        except Exception as e:
+            logger.error("ERROR in pre_execution_hook...")
+            logger.error(traceback.format_exc())
+            raise(e)
+
+    def resolve_identity(self):
+        """
+        Resolve the user of the execution and its stage-out storage, from the
+        Workspace API when used.
+        """
+        # decode the JWT token to get the user name
+        username_source = None
+        if self.ades_rx_token:
+            import jwt
+
+            self.username = self.get_user_name(
+                jwt.decode(self.ades_rx_token, options={"verify_signature": False})
+            )
+            if self.username:
+                username_source = "JWT"
+
+        # Else get username from Path-Prefix - already parsed into env var
+        if not self.username:
+            self.username = os.getenv("SERVICES_NAMESPACE")
+            if self.username:
+                username_source = "Path-Prefix"
+
+        # Log username outcome
+        if self.username:
+            logger.info(f"Using username {self.username} from {username_source}")
+        else:
+            logger.warning("Unable to determine username")
+
+        if self.use_workspace:
+            logger.info("Lookup storage details in Workspace")
+            storage_credentials = self.credential_cache.get(self.username)
+            if storage_credentials is not None:
+                logger.info("Using cached workspace storage details")
+            elif self.credential_cache.api_available():
+                storage_credentials = self.get_workspace_credentials()
+            else:
+                logger.warning("Workspace API is marked unhealthy, skipping the lookup")
+
+            if storage_credentials is not None:
+                logger.info("Set user bucket settings")
+
+                self.conf["additional_parameters"]["STAGEOUT_AWS_SERVICEURL"] = storage_credentials.get("endpoint")
+                self.conf["additional_parameters"]["STAGEOUT_AWS_ACCESS_KEY_ID"] = storage_credentials.get("access")
+                self.conf["additional_parameters"]["STAGEOUT_AWS_SECRET_ACCESS_KEY"] = storage_credentials.get("secret")
+                self.conf["additional_parameters"]["STAGEOUT_AWS_REGION"] = storage_credentials.get("region")
+                self.conf["additional_parameters"]["STAGEOUT_OUTPUT"] = storage_credentials.get("bucketname")
+            # No details from the Workspace API - fallback to the pre-configured storage
+            else:
+                self.use_workspace = False
+                logger.info("Using pre-configured storage details")
+        else:
+            logger.info("Using pre-configured storage details")
+
+        self.identity_resolved = True
+
+    def identity(self):
+        """
+        The user and stage-out storage resolved by resolve_identity, to share with
+        other executions.
+        """
+        return {
+            "username": self.username,
+            "use_workspace": self.use_workspace,
+            "storage": {
+                name: value
+                for name, value in self.conf["additional_parameters"].items()
+                if name.startswith("STAGEOUT_AWS_") or name == "STAGEOUT_OUTPUT"
+            },
+        }
+
+    def adopt_identity(self, identity):
+        """
+        Use the user and stage-out storage resolved by another execution, see identity.
+        """
+        self.username = identity["username"]
+        self.use_workspace = identity["use_workspace"]
+        self.conf["additional_parameters"].update(identity["storage"])
+        self.identity_resolved = True
+
+    def stagein_assets(self):
+        """
+        The assets stage-in selects, by key or band name: the requested bands and
+        the always included ones.
+        """
+        if not self.stagein_select_assets or self.inputs is None:
+            return []
+        bands = [str(band) for band in input_values(self.inputs, "bands")]
+        if not bands:
+            return []
+        selection = list(dict.fromkeys(bands + self.stagein_always_include))
+        logger.info(f"Stage-in of the assets {', '.join(selection)}")
+        return selection
+
+    def stagein_aoi(self):
+        """
+        The stage-in parameters cropping cloud-optimized rasters to the aoi, an empty
+        aoi stages them whole.
+        """
+        aoi = (
+            input_values(self.inputs, "aoi")
+            if self.stagein_aoi_window and self.inputs is not None
+            else []
+        )
+        epsg = input_values(self.inputs, "epsg") if aoi else []
+        if aoi:
+            logger.info(f"Stage-in of cloud-optimized rasters cropped to the aoi {aoi[0]}")
+        return {
+            "STAGEIN_AOI": str(aoi[0]) if aoi else "",
+            "STAGEIN_AOI_EPSG": str(epsg[0]) if epsg else "EPSG:4326",
+            "STAGEIN_AOI_MARGIN": str(self.stagein_aoi_margin),
+        }
+
+    @timed("check_inputs")
+    def check_inputs(self):
+        """
+        Read the input STAC items and check them against the other inputs, see
+        check_stac_inputs.
+        """
+        from .stac_io import CustomStacIO
+
+        logger.info("Check the input STAC items")
+        self.configure_stac_io()
+        # the items are read with the credentials the stage-in step uses
+        additional_parameters = self.conf.get("additional_parameters", {})
+        stac_io = CustomStacIO(
+            endpoint_url=additional_parameters.get("STAGEIN_AWS_SERVICEURL"),
+            region_name=additional_parameters.get("STAGEIN_AWS_REGION"),
+            aws_access_key_id=additional_parameters.get("STAGEIN_AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=additional_parameters.get("STAGEIN_AWS_SECRET_ACCESS_KEY"),
+            proxies=self.s3_proxies,
+        )
+        check_stac_inputs(self.inputs, stac_io, max_workers=self.preflight_concurrency)
+        self.inputs_checked = True
+
+    @timed("get_workspace_credentials")
+    def get_workspace_credentials(self):
+        """
+        Request the storage credentials of the user from the Workspace API.
+
+        Successful lookups are cached and close the circuit breaker, timeouts and
+        server errors count as failures of the API. Returns None on any problem.
+        """
+        import requests
+
+        # Workspace API endpoint
+        uri_for_request = f"workspaces/{self.workspace_prefix}-{self.username}"
+
+        workspace_api_endpoint = os.path.join(self.workspace_url, uri_for_request)
+        logger.info(f"Using Workspace API endpoint {workspace_api_endpoint}")
+
+        # Request: Get Workspace Details
+        headers = {
+            "accept": "application/json",
+        }
+        if self.ades_rx_token:
+            headers["Authorization"] = f"Bearer {self.ades_rx_token}"
+        try:
+            get_workspace_details_response = requests.get(
+                workspace_api_endpoint,
+                headers=headers,
+                timeout=self.workspace_timeout,
+                proxies=self.requests_proxies,
+            )
+        except requests.RequestException as e:
+            logger.error(f"Problem connecting with the Workspace API: {e}")
+            self.credential_cache.record_failure()
+            return None
+
+        # GOOD response from Workspace API - use the details
+        if get_workspace_details_response.ok:
+            storage_credentials = get_workspace_details_response.json()["storage"]["credentials"]
+            self.credential_cache.put(self.username, storage_credentials)
+            self.credential_cache.record_success()
+            return storage_credentials
+
+        # BAD response from Workspace API
+        logger.error("Problem connecting with the Workspace API")
+        logger.info(f"  Response code = {get_workspace_details_response.status_code}")
+        logger.info(f"  Response text = \n{get_workspace_details_response.text}")
+        if get_workspace_details_response.status_code >= 500:
+            self.credential_cache.record_failure()
+        else:
+            self.credential_cache.record_success()
+        if get_workspace_details_response.status_code in (401, 403):
+            self.credential_cache.invalidate(self.username)
+        return None
+
+    @timed("post_execution_hook")
+    def post_execution_hook(self, log, output, usage_report, tool_logs):
+        try:
+            logger.info("Post execution hook")
+
+            from botocore.exceptions import ClientError
+            from pystac import read_file
+            from pystac.utils import make_absolute_href
+
+            from .stac_io import (
+                MANIFEST_NAME,
+                CustomStacIO,
+                http_session_cache,
+                iter_catalog_items,
+                iter_manifest_items,
+                s3_client_cache,
+                stac_document_cache,
+            )
+
+            self.configure_stac_io()
+
+            # DEBUG
+            # logger.info(f"zzz POST-HOOK - config...\n{json.dumps(self.conf, indent=2)}\n")
+
+            logger.info("Set user bucket settings")
+            additional_parameters = self.conf["additional_parameters"]
+            stac_io = CustomStacIO(
+                endpoint_url=additional_parameters["STAGEOUT_AWS_SERVICEURL"],
+                region_name=additional_parameters["STAGEOUT_AWS_REGION"],
+                aws_access_key_id=additional_parameters["STAGEOUT_AWS_ACCESS_KEY_ID"],
+                aws_secret_access_key=additional_parameters["STAGEOUT_AWS_SECRET_ACCESS_KEY"],
+                proxies=self.s3_proxies,
+            )
+
+            logger.info(f"Read catalog => STAC Catalog URI: {output['StacCatalogUri']}")
+            with self.timer.span("read_catalog"):
+                try:
+                    s3_path = output["StacCatalogUri"]
+                    if s3_path.count("s3://")==0:
+                        s3_path = "s3://" + s3_path
+                    cat = read_file(s3_path, stac_io=stac_io)
+                except ClientError as e:
+                    logger.error(f"Exception: {e}")
+                    if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") in (401, 403):
+                        self.credential_cache.invalidate(self.username)
+                except Exception as e:
+                    logger.error(f"Exception: {e}")
+
+            collection_id = self.conf["additional_parameters"]["collection_id"]
+            logger.info(f"Create collection with ID {collection_id}")
+            self.feature_collection = None
+            output_collection = False
+            with self.timer.span("build_collection") as span:
+                try:
+                    collections = iter(()) if self.batch_member else cat.get_all_collections()
+                    collection = next(collections)
+                    logger.info("Got collection from outputs")
+
+                    collection_dict=collection.to_dict()
+                    collection_dict["id"]=collection_id
+
+                    # Set the feature collection to be returned
+                    self.feature_collection = self.dumps(collection_dict)
+                    output_collection = True
+                except:
+                    try:
+                        # the item manifest of stage-out costs one read, walking the
+                        # catalog one per item
+                        manifest_href = make_absolute_href(MANIFEST_NAME, s3_path)
+                        try:
+                            documents = iter_manifest_items(manifest_href, stac_io)
+                            logger.info(f"Read items from the manifest {manifest_href}")
+                        except Exception as e:
+                            logger.info(
+                                f"No item manifest at {manifest_href} ({e}), walking the catalog"
+                            )
+                            documents = iter_catalog_items(
+                                s3_path, stac_io, max_workers=self.stac_read_concurrency
+                            )
+                        self.feature_collection = dump_feature_collection(
+                            self.iter_output_features(documents, collection_id),
+                            collection_id,
+                            compact=self.output_compact,
+                        )
+                        logger.info("Created collection from items")
+                    except Exception as e:
+                        logger.error(f"Exception: {e}"+str(e))
+                span["items"] = self.output_items
+                span["bytes"] = len(self.feature_collection or "")
+
+            # Trap the case of no output collection
+            if self.feature_collection is None:
+                logger.error("ABORT: The output collection is empty")
+                self.feature_collection = json.dumps({}, indent=2)
+                return
+
+            self.catalog_uri = s3_path
+
+            # Register with the workspace
+            if self.use_workspace and not self.batch_member:
+                # the items of an output collection are registered from the item
+                # manifest when there is one, rather than by a crawl of the catalog
+                items = None
+                if output_collection:
+                    with self.timer.span("read_manifest"):
+                        items = self.read_manifest_features(s3_path, stac_io, collection_id)
+                self.register_outputs(s3_path, collection_id, items=items)
+
+            logger.info(f"S3 client cache: {s3_client_cache.stats()}")
+            logger.info(f"HTTP session cache: {http_session_cache.stats()}")
+            logger.info(f"STAC document cache: {stac_document_cache.stats()}")
+
+        except Exception as e:
+            logger.error("ERROR in post_execution_hook...")
+            logger.error(traceback.format_exc())
+            raise(e)
+
+    def configure_stac_io(self):
+        """
+        Apply the settings of the execution to the clients, sessions and cache shared
+        by the StacIOs.
+        """
+        from .stac_io import http_session_cache, s3_client_cache, stac_document_cache
+
+        s3_client_cache.configure(
+            max_pool_connections=(
+                int(self.s3_max_pool_connections) if self.s3_max_pool_connections is not None else None
+            ),
+            tcp_keepalive=(
+                str(self.s3_tcp_keepalive).lower() == "true"
+                if self.s3_tcp_keepalive is not None
+                else None
+            ),
+        )
+        timeout = None
+        if self.http_connect_timeout is not None or self.http_read_timeout is not None:
+            connect_timeout, read_timeout = http_session_cache.timeout
+            timeout = (
+                (
+                    float(self.http_connect_timeout)
+                    if self.http_connect_timeout is not None
+                    else connect_timeout
+                ),
+                float(self.http_read_timeout) if self.http_read_timeout is not None else read_timeout,
+            )
+        http_session_cache.configure(
+            pool_maxsize=int(self.http_pool_maxsize) if self.http_pool_maxsize is not None else None,
+            timeout=timeout,
+            retries=int(self.http_retries) if self.http_retries is not None else None,
+            backoff=float(self.http_backoff) if self.http_backoff is not None else None,
+            gzip=str(self.http_gzip).lower() == "true" if self.http_gzip is not None else None,
+        )
+        stac_document_cache.configure(
+            path=self.stac_cache_dir,
+            max_age=float(self.stac_cache_max_age) if self.stac_cache_max_age is not None else None,
+            max_bytes=int(self.stac_cache_max_bytes) if self.stac_cache_max_bytes is not None else None,
+        )
+
+    def register_outputs(self, catalog_uri, collection_id, items=None):
+        """
+        Register the feature collection and the output catalog in the user workspace.
+
+        Without a catalog, as for a batch, only the feature collection is registered.
+        With `items`, the feature collection of the items of the catalog, these are
+        registered as they are instead of the workspace crawling the catalog.
+        """
+        workspace_name = f"{self.workspace_prefix}-{self.username}"
+        logger.info(f"Register collection in workspace {workspace_name}")
+        workspace = WorkspaceRegistrationClient(
+            f"{self.workspace_url}/workspaces/{workspace_name}",
+            token=self.ades_rx_token,
+            timeout=self.workspace_timeout,
+            retries=self.workspace_retries,
+            chunk_size=self.workspace_register_chunk_size,
+            proxies=self.requests_proxies,
+            catalog_endpoint=self.workspace_catalog_url.format(workspace=workspace_name) or None,
+        )
+        with self.timer.span("register_collection", bytes=len(self.feature_collection)):
+            r = workspace.register_json(self.feature_collection)
+        logger.info(f"Register collection response: {r.status_code}")
+        if r.status_code in (401, 403):
+            self.credential_cache.invalidate(self.username)
+
+        if items is not None:
+            logger.info("Register processing results from the item manifest")
+            with self.timer.span("register_results", bytes=len(items)):
+                r = workspace.register_json(items)
+            logger.info(f"Register processing results response: {r.status_code}")
+        elif catalog_uri is not None:
+            logger.info("Register processing results to collection")
+            with self.timer.span("register_results"):
+                r = workspace.register(catalog_uri)
+            logger.info(f"Register processing results response: {r.status_code}")
+
+        # wait for the catalog to serve the collection before reporting the job done
+        if self.workspace_readiness_deadline > 0:
+            with self.timer.span("wait_for_collection"):
+                available = workspace.wait_for_collection(
+                    collection_id,
+                    deadline=self.workspace_readiness_deadline,
+                    interval=self.workspace_readiness_interval,
+                )
+            if available:
+                logger.info(f"Collection {collection_id} is available in the workspace catalog")
+            else:
+                logger.warning(
+                    f"Collection {collection_id} not available in the workspace catalog "
+                    f"after {self.workspace_readiness_deadline} seconds"
+                )
+
+    @timed("reuse_results")
+    def reuse_results(self, key):
+        """
+        Serve the execution from the memoized results of an identical one.
+
+        The results are reused when the output catalog of the prior execution is
+        still in the stage-out storage. The feature collection then takes the id of
+        this execution and is registered in the workspace, no job is submitted.
+
+        :param key: the key of the execution, from ExecutionMemo.key
+        :return: True if the results were reused
+        """
+        from urllib.parse import urlparse
+
+        from .stac_io import s3_client_cache
+
+        found = self.memo.lookup(key)
+        if found is None:
+            logger.info(f"No memoized results for execution {key}")
+            return False
+        entry, feature_collection = found
+
+        parsed = urlparse(entry["catalog_uri"])
+        s3_client = s3_client_cache.get_client(
+            endpoint_url=self.conf["additional_parameters"]["STAGEOUT_AWS_SERVICEURL"],
+            region_name=self.conf["additional_parameters"]["STAGEOUT_AWS_REGION"],
+            aws_access_key_id=self.conf["additional_parameters"]["STAGEOUT_AWS_ACCESS_KEY_ID"],
+            aws_secret_access_key=self.conf["additional_parameters"]["STAGEOUT_AWS_SECRET_ACCESS_KEY"],
+            proxies=self.s3_proxies,
+        )
+        try:
+            s3_client.head_object(Bucket=parsed.netloc, Key=parsed.path[1:])
+        except Exception as e:
+            logger.info(f"Memoized results of execution {key} are gone ({e}), running it")
+            self.memo.discard(key)
+            return False
+
+        collection_id = self.conf["additional_parameters"]["collection_id"]
+        logger.info(f"Reusing the results in {entry['catalog_uri']} as collection {collection_id}")
+        document = json.loads(feature_collection)
+        document["id"] = collection_id
+        for feature in document.get("features", []):
+            feature["collection"] = collection_id
+        self.feature_collection = self.dumps(document)
+        self.catalog_uri = entry["catalog_uri"]
+
+        if self.use_workspace and not self.batch_member:
+            self.register_outputs(self.catalog_uri, collection_id)
+        return True
+
+    def read_manifest_features(self, catalog_uri, stac_io, collection_id):
+        """
+        Return the feature collection of the items in the item manifest of a catalog.
+
+        :param catalog_uri: the output catalog, next to which stage-out writes it
+        :param stac_io: the CustomStacIO used to read it
+        :param collection_id: the collection the items are assigned to
+        :return: the feature collection as a JSON string, or None without a manifest
+        """
+        from pystac.utils import make_absolute_href
+
+        from .stac_io import MANIFEST_NAME, iter_manifest_items
+
+        manifest_href = make_absolute_href(MANIFEST_NAME, catalog_uri)
+        try:
+            documents = iter_manifest_items(manifest_href, stac_io)
+            features = self.iter_output_features(documents, collection_id)
+            return dump_feature_collection(features, collection_id, compact=True)
+        except Exception as e:
+            logger.info(f"No item manifest at {manifest_href} ({e}), the workspace crawls the catalog")
+            return None
+
+    def iter_output_features(self, documents, collection_id):
+        """
+        Annotate the output items and yield them one by one as feature dicts.
+
+        The `storage:*` fields are computed once and added to the assets in place,
+        items are not attached to the catalog nor cloned, so only the item being
+        processed is held in memory.
+
+        :param documents: (href, dict) pairs of the output items
+        :param collection_id: the collection the items are assigned to
+        """
+        from pystac import Item
+
+        storage = {
+            "storage:platform": "EOEPCA",
+            "storage:requester_pays": False,
+            "storage:tier": "Standard",
+            "storage:region": self.conf["additional_parameters"]["STAGEOUT_AWS_REGION"],
+            "storage:endpoint": self.conf["additional_parameters"]["STAGEOUT_AWS_SERVICEURL"],
+        }
+        for href, document in documents:
+            item = Item.from_dict(document, href=href, preserve_dict=False)
+            # links as the catalog walk of pystac leaves them: the root and parent
+            # links resolved against the item's href, the self and then the parent
+            # link last, the others as in the document
+            for link in item.links:
+                if link.rel in ("root", "parent"):
+                    link.target = link.get_absolute_href()
+            for rel in ("self", "parent"):
+                moved = [link for link in item.links if link.rel == rel]
+                item.links = [link for link in item.links if link.rel != rel] + moved
+            for asset in item.assets.values():
+                asset.extra_fields.update(storage)
+            item.collection_id = collection_id
+            self.output_items += 1
+            yield item.to_dict(transform_hrefs=False)
+
+    def results_path(self, file_name):
+        """
+        Local path and URL of a file published next to the tool logs of the execution.
+        """
+        folder = f"{self.conf['lenv']['Identifier']}-{self.conf['lenv']['usid']}"
+        os.makedirs(os.path.join(self.conf["main"]["tmpPath"], folder), exist_ok=True)
+        return (
+            os.path.join(self.conf["main"]["tmpPath"], folder, file_name),
+            os.path.join(self.conf["main"]["tmpUrl"], folder, file_name),
+        )
+
+    def dumps(self, document):
+        """Serialize an output document, compact or indented as configured."""
+        return dumps_compact(document) if self.output_compact else json.dumps(document, indent=2)
+
+    def set_output(self, outputs):
+        """
+        Set the feature collection as the value of the first output.
+
+        Beyond output_inline_max_size the collection is written to a file under
+        tmpPath instead, given to ZOO as the generated file of the output, which
+        returns it inline or by reference as the client asked.
+        """
+        output = outputs[list(outputs.keys())[0]]
+        logger.info(f"Setting Collection into output key {list(outputs.keys())[0]}")
+        feature_collection = self.feature_collection
+        if (
+            feature_collection is None
+            or self.output_inline_max_size is None
+            or len(feature_collection) <= self.output_inline_max_size
+        ):
+            output["value"] = feature_collection
+            output.pop("generated_file", None)
+            return
+
+        path, url = self.results_path("feature-collection.json")
+        tmp_path = f"{path}.tmp"
+        with self.timer.span("write_output", bytes=len(feature_collection)):
+            with open(tmp_path, "w", encoding="utf-8") as stream:
+                stream.write(feature_collection)
+            os.replace(tmp_path, path)
+        logger.info(f"Collection of {len(feature_collection)} characters written to {url}")
+        output.pop("value", None)
+        output["generated_file"] = path
+
+    def write_timings(self):
+        try:
+            path, _ = self.results_path("timings.json")
+            self.timer.write(
+                path, identifier=self.conf["lenv"]["Identifier"], usid=self.conf["lenv"]["usid"]
+            )
+        except Exception as e:
+            logger.warning(f"Unable to write the execution timings: {e}")
+
+    @contextmanager
+    def profile(self):
+        """Profile the enclosed block when enabled with conf["eoepca"]["profiler"]."""
+        if self.profiler == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(self.results_path("profile.prof")[0])
+        elif self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(self.results_path("profile.html")[0], "w") as stream:
+                    stream.write(profiler.output_html())
+        else:
+            yield
+
+    @staticmethod
+    def init_config_defaults(conf):
+        if "additional_parameters" not in conf:
+            conf["additional_parameters"] = {}
+
+        conf["additional_parameters"]["STAGEIN_AWS_SERVICEURL"] = os.environ.get("STAGEIN_AWS_SERVICEURL", "http://s3-service.zoo.svc.cluster.local:9000")
+        conf["additional_parameters"]["STAGEIN_AWS_ACCESS_KEY_ID"] = os.environ.get("STAGEIN_AWS_ACCESS_KEY_ID", "minio-admin")
+        conf["additional_parameters"]["STAGEIN_AWS_SECRET_ACCESS_KEY"] = os.environ.get("STAGEIN_AWS_SECRET_ACCESS_KEY", "minio-secret-password")
+        conf["additional_parameters"]["STAGEIN_AWS_REGION"] = os.environ.get("STAGEIN_AWS_REGION", "RegionOne")
+
+        conf["additional_parameters"]["STAGEOUT_AWS_SERVICEURL"] = os.environ.get("STAGEOUT_AWS_SERVICEURL", "http://s3-service.zoo.svc.cluster.local:9000")
+        conf["additional_parameters"]["STAGEOUT_AWS_ACCESS_KEY_ID"] = os.environ.get("STAGEOUT_AWS_ACCESS_KEY_ID", "minio-admin")
+        conf["additional_parameters"]["STAGEOUT_AWS_SECRET_ACCESS_KEY"] = os.environ.get("STAGEOUT_AWS_SECRET_ACCESS_KEY", "minio-secret-password")
+        conf["additional_parameters"]["STAGEOUT_AWS_REGION"] = os.environ.get("STAGEOUT_AWS_REGION", "RegionOne")
+        conf["additional_parameters"]["STAGEOUT_OUTPUT"] = os.environ.get("STAGEOUT_OUTPUT", "eoepca")
+
+        # DEBUG
+        # logger.info(f"init_config_defaults: additional_parameters...\n{json.dumps(conf['additional_parameters'], indent=2)}\n")
+
+    @staticmethod
+    def get_user_name(decodedJwt) -> str | None:
+        for key in ["username", "user_name", "preferred_username"]:
+            if key in decodedJwt:
+                return decodedJwt[key]
+        return None
+
+    @staticmethod
+    def local_get_file(fileName):
+        """
+        Read and load the contents of a yaml file
+
+        :param yaml file to load
+        """
+        import yaml
+
+        try:
+            # the files read here hold secrets (image pull secrets): not pickled to disk
+            return load_yaml_cached(fileName, disk_cache=False)
+        # if file does not exist
+        except FileNotFoundError:
+            return {}
+        # if file is empty
+        except yaml.YAMLError:
+            return {}
+        # if file is not yaml
+        except yaml.scanner.ScannerError:
+            return {}
+
+    def get_pod_env_vars(self):
+        logger.info("get_pod_env_vars")
+
+        return self.conf.get("pod_env_vars", {})
+
+    def get_pod_node_selector(self):
+        logger.info("get_pod_node_selector")
+
+        return self.conf.get("pod_node_selector", {})
+
+    def get_secrets(self):
+        logger.info("get_secrets")
+
+        return self.local_get_file("/assets/pod_imagePullSecrets.yaml")
+
+    def get_additional_parameters(self):
+        logger.info("get_additional_parameters")
+
+        return self.conf.get("additional_parameters", {})
+
+    @timed("handle_outputs")
+    def handle_outputs(self, log, output, usage_report, tool_logs):
+        """
+        Handle the output files of the execution.
+
+        :param log: The application log file of the execution.
+        :param output: The output file of the execution.
+        :param usage_report: The metrics file.
+        :param tool_logs: A list of paths to individual workflow step logs.
+
+        """
+        try:
+            logger.info("handle_outputs")
+
+            # link element to add to the statusInfo
+            servicesLogs = [
+                {
+                    "url": os.path.join(self.conf['main']['tmpUrl'],
+                                        f"{self.conf['lenv']['Identifier']}-{self.conf['lenv']['usid']}",
+                                        os.path.basename(tool_log)),
+                    "title": f"Tool log {os.path.basename(tool_log)}",
+                    "rel": "related",
+                }
+                for tool_log in tool_logs
+            ]
+
+            # timing record of the execution, and its profile when enabled
+            servicesLogs.append(
+                {
+                    "url": self.results_path("timings.json")[1],
+                    "title": "Execution timings",
+                    "rel": "related",
+                }
+            )
+            if self.profiler in ("cprofile", "pyinstrument"):
+                profile_file = "profile.prof" if self.profiler == "cprofile" else "profile.html"
+                servicesLogs.append(
+                    {
+                        "url": self.results_path(profile_file)[1],
+                        "title": "Execution profile",
+                        "rel": "related",
+                    }
+                )
+            for i in range(len(servicesLogs)):
+                okeys = ["url", "title", "rel"]
+                keys = ["url", "title", "rel"]
+                if i > 0:
+                    for j in range(len(keys)):
+                        keys[j] = keys[j] + "_" + str(i)
+                if "service_logs" not in self.conf:
+                    self.conf["service_logs"] = {}
+                for j in range(len(keys)):
+                    self.conf["service_logs"][keys[j]] = servicesLogs[i][okeys[j]]
+
+            self.conf["service_logs"]["length"] = str(len(servicesLogs))
+
+            self.write_timings()
+
+        except Exception as e:
+            logger.error("ERROR in handle_outputs...")
+            logger.error(traceback.format_exc())
+            raise(e)
+
+
+def execute(conf, inputs, outputs, member=None):
+    """
+    Run an execution of the application package in this process.
+
+    :param member: for the members of a batch, a dict with the "identity" resolved
+        by the batch, where the feature collection of the items is returned
+    """
+
+    try:
+        timer = ExecutionTimer()
+
+        app_package = os.path.join(os.path.dirname(os.path.realpath(__file__)), "app-package.cwl")
+
+        with timer.span("parse_cwl"):
+            cwl = load_yaml_cached(app_package)
+
+        with timer.span("create_runner"):
+            execution_handler = EoepcaCalrissianRunnerExecutionHandler(
+                conf=conf, inputs=inputs, timer=timer
+            )
+            if member is not None:
+                execution_handler.adopt_identity(member["identity"])
+                execution_handler.batch_member = True
+                execution_handler.memo = None
+
+            runner = EoepcaCalrissianRunner(
+                cwl=cwl,
+                conf=conf,
+                inputs=inputs,
+                outputs=outputs,
+                execution_handler=execution_handler,
+            )
+
+        # an identical execution of the same user may have results to reuse; the
+        # pre-execution hook resolves the user and the stage-out storage first
+        memo_key = None
+        if execution_handler.memo is not None:
+            execution_handler.pre_execution_hook()
+            memo_key = execution_handler.memo.key(execution_handler.username, inputs, app_package)
+            if execution_handler.reuse_results(memo_key):
+                execution_handler.set_output(outputs)
+                execution_handler.write_timings()
+                return zoo.SERVICE_SUCCEEDED
+
+        if execution_handler.monitor_interval is not None:
+            runner.monitor_interval = execution_handler.monitor_interval
+        # we are changing the working directory to store the outputs
+        # in a directory dedicated to this execution; the runner writes to the
+        # current directory, so executions cannot share a process concurrently
+        working_dir = os.path.join(conf["main"]["tmpPath"], runner.get_namespace_name())
+        os.makedirs(
+            working_dir,
+            mode=0o777,
+            exist_ok=True,
+        )
+        os.chdir(working_dir)
+
+        with timer.span("execute"), execution_handler.profile():
+            exit_status = runner.execute()
+
+        if exit_status == zoo.SERVICE_SUCCEEDED:
+            execution_handler.set_output(outputs)
+            execution_handler.write_timings()
+            if member is not None:
+                member["feature_collection"] = execution_handler.feature_collection
+            if memo_key is not None and execution_handler.catalog_uri is not None:
+                try:
+                    execution_handler.memo.record(
+                        memo_key, execution_handler.feature_collection, execution_handler.catalog_uri
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not memoize the results of the execution: {e}")
+            return zoo.SERVICE_SUCCEEDED
+
+        else:
+            execution_handler.write_timings()
+            conf["lenv"]["message"] = zoo._("Execution failed")
+            return zoo.SERVICE_FAILED
+
+    except InputValidationError as e:
+        logger.error(f"Invalid inputs:\n{e}")
+        conf["lenv"]["message"] = zoo._(f"Invalid inputs:\n{e}")
+        return zoo.SERVICE_FAILED
+
+    except Exception as e:
+        logger.error("ERROR in processing execution template...")
+        stack = traceback.format_exc()
+        logger.error(stack)
+        conf["lenv"]["message"] = zoo._(f"Exception during execution...\n{stack}\n")
+        return zoo.SERVICE_FAILED
+
+
+def _execute_member(conf, inputs, outputs, identity):
+    """Run a member of a batch in a worker process of the batch, see execute_batch."""
+    # progress is reported by the batch, for its own execution
+    for reporter in (zoo, getattr(zoo_calrissian_runner, "zoo", None)):
+        if reporter is not None:
+            reporter.update_status = lambda conf, progress: None
+
+    member = {"identity": identity}
+    status = execute(conf, inputs, outputs, member=member)
+    return status, conf["lenv"].get("message"), member.get("feature_collection")
+
+
+def execute_batch(conf, input_sets, outputs):
+    """
+    Run an execution of the application package for each of several input sets.
+
+    The user and its stage-out storage are resolved, and the application package
+    parsed, once for the batch. The members run in up to batch_concurrency worker
+    processes forked from this one, each with its own working directory and
+    reusing its S3 clients across the members it runs. Their items are merged
+    into one feature collection, the output of the batch, registered in the
+    workspace at once.
+
+    :param conf: the ZOO configuration of the batch
+    :param input_sets: the inputs of each member
+    :param outputs: the outputs of the batch
+    """
+    import copy
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    try:
+        timer = ExecutionTimer()
+
+        with timer.span("parse_cwl"):
+            load_yaml_cached(
+                os.path.join(os.path.dirname(os.path.realpath(__file__)), "app-package.cwl")
+            )
+
+        execution_handler = EoepcaCalrissianRunnerExecutionHandler(conf=conf, timer=timer)
+        with timer.span("resolve_identity"):
+            execution_handler.resolve_identity()
+        identity = execution_handler.identity()
+
+        usid = conf["lenv"]["usid"]
+        max_workers = int(conf.get("eoepca", {}).get("batch_concurrency", 4))
+        logger.info(f"Batch of {len(input_sets)} executions, {max_workers} at a time")
+
+        results = [None] * len(input_sets)
+        with timer.span("execute", members=len(input_sets)), ProcessPoolExecutor(
+            max_workers=max(1, min(max_workers, len(input_sets))),
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            futures = {}
+            for index, inputs in enumerate(input_sets):
+                member_conf = copy.deepcopy(conf)
+                member_conf["lenv"]["usid"] = f"{usid}-{index}"
+                member_conf["lenv"]["message"] = ""
+                member_outputs = copy.deepcopy(outputs)
+                future = executor.submit(_execute_member, member_conf, inputs, member_outputs, identity)
+                futures[future] = index
+
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = (zoo.SERVICE_FAILED, str(e), None)
+                logger.info(f"Batch member {index} done, {done} of {len(input_sets)}")
+                conf["lenv"]["message"] = f"{done} of {len(input_sets)} executions done"
+                zoo.update_status(conf, int(100 * done / len(input_sets)))
+
+        # the items of all the members, in one collection named after the batch
+        failures = []
+        features = []
+        for index, (status, message, feature_collection) in enumerate(results):
+            if status != zoo.SERVICE_SUCCEEDED:
+                failures.append(f"execution {index}: {message}")
+                continue
+            features.extend(json.loads(feature_collection or "{}").get("features", []))
+        for feature in features:
+            feature["collection"] = usid
+        execution_handler.output_items = len(features)
+        execution_handler.feature_collection = execution_handler.dumps(
+            {"type": "FeatureCollection", "features": features, "id": usid}
+        )
+
+        if features and execution_handler.use_workspace:
+            execution_handler.register_outputs(None, usid)
+
+        execution_handler.set_output(outputs)
+        execution_handler.write_timings()
+
+        if failures:
+            logger.error(f"{len(failures)} of {len(input_sets)} executions failed")
+            conf["lenv"]["message"] = zoo._(
+                f"{len(failures)} of {len(input_sets)} executions failed:\n" + "\n".join(failures)
+            )
+            return zoo.SERVICE_FAILED
+        return zoo.SERVICE_SUCCEEDED
+
+    except Exception:
+        logger.error("ERROR in processing batch execution...")
+        stack = traceback.format_exc()
+        logger.error(stack)
+        conf["lenv"]["message"] = zoo._(f"Exception during batch execution...\n{stack}\n")
+        return zoo.SERVICE_FAILED
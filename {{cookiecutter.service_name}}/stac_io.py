@@ -0,0 +1,543 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import urlparse
+
+import botocore.session
+import requests
+from botocore.client import Config
+from botocore.exceptions import ClientError
+from pystac.stac_io import DefaultStacIO, StacIO
+from pystac.utils import make_absolute_href
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# newline-delimited item manifest written by stage-out next to catalog.json
+MANIFEST_NAME = "items.ndjson"
+
+
+class S3ClientCache:
+    """Process-wide registry of warm S3 clients.
+
+    Clients are keyed by endpoint, region and credentials, so every CustomStacIO
+    instance created by pystac reuses the same connection pool instead of
+    building a new botocore session and TLS connection for each document.
+    """
+
+    def __init__(self, max_pool_connections=10, tcp_keepalive=True):
+        self.max_pool_connections = max_pool_connections
+        self.tcp_keepalive = tcp_keepalive
+        self.hits = 0
+        self.misses = 0
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_pool_connections=None, tcp_keepalive=None):
+        """Update the connection settings, dropping clients built with the old ones."""
+        with self._lock:
+            changed = False
+            if max_pool_connections is not None and max_pool_connections != self.max_pool_connections:
+                self.max_pool_connections = max_pool_connections
+                changed = True
+            if tcp_keepalive is not None and tcp_keepalive != self.tcp_keepalive:
+                self.tcp_keepalive = tcp_keepalive
+                changed = True
+            if changed:
+                self._clients.clear()
+
+    def get_client(
+        self,
+        endpoint_url=None,
+        region_name=None,
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        proxies=None,
+    ):
+        # botocore applies NO_PROXY to the proxies it finds in the environment only
+        if (
+            proxies
+            and endpoint_url
+            and requests.utils.should_bypass_proxies(endpoint_url, no_proxy=None)
+        ):
+            proxies = {}
+        # the secret is only kept as a digest in the key
+        secret_digest = hashlib.sha256((aws_secret_access_key or "").encode("utf-8")).hexdigest()
+        proxies_key = tuple(sorted(proxies.items())) if proxies is not None else None
+        key = (endpoint_url, region_name, aws_access_key_id, secret_digest, proxies_key)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            client = botocore.session.Session().create_client(
+                service_name="s3",
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                verify=True,
+                use_ssl=True,
+                config=Config(
+                    max_pool_connections=self.max_pool_connections,
+                    tcp_keepalive=self.tcp_keepalive,
+                    proxies=proxies,
+                    s3={"addressing_style": "path", "signature_version": "s3v4"},
+                ),
+            )
+            self._clients[key] = client
+            return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "clients": len(self._clients)}
+
+
+s3_client_cache = S3ClientCache(
+    max_pool_connections=int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "10")),
+    tcp_keepalive=os.environ.get("S3_TCP_KEEPALIVE", "true").lower() == "true",
+)
+
+
+class HttpSessionCache:
+    """Process-wide registry of keep-alive HTTP sessions, one per host.
+
+    Documents read over http(s) go through a pooled requests session, so
+    reading many items of a remote catalog reuses a few warm connections
+    instead of paying DNS, TCP and TLS for each. Requests time out, are retried
+    with backoff on connection errors and on 429 and 5xx responses, and accept
+    gzip unless disabled.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_maxsize=10, timeout=(10, 60), retries=3, backoff=0.5, gzip=True):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.gzip = gzip
+        self.hits = 0
+        self.misses = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_maxsize=None, timeout=None, retries=None, backoff=None, gzip=None):
+        """Update the connection settings, dropping sessions built with the old ones."""
+        with self._lock:
+            settings = {
+                "pool_maxsize": pool_maxsize,
+                "timeout": timeout,
+                "retries": retries,
+                "backoff": backoff,
+                "gzip": gzip,
+            }
+            changed = False
+            for name, value in settings.items():
+                if value is not None and value != getattr(self, name):
+                    setattr(self, name, value)
+                    changed = True
+            if changed:
+                self._close()
+
+    def get_session(self, url):
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self.hits += 1
+                return session
+
+            self.misses += 1
+            session = requests.Session()
+            retry = Retry(
+                total=self.retries,
+                backoff_factor=self.backoff,
+                status_forcelist=self.RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                raise_on_status=False,
+            )
+            session.mount(
+                f"{parsed.scheme}://", HTTPAdapter(pool_maxsize=self.pool_maxsize, max_retries=retry)
+            )
+            session.headers["Accept-Encoding"] = "gzip, deflate" if self.gzip else "identity"
+            self._sessions[key] = session
+            return session
+
+    def _close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+    def clear(self):
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "sessions": len(self._sessions)}
+
+
+http_session_cache = HttpSessionCache(
+    pool_maxsize=int(os.environ.get("HTTP_POOL_MAXSIZE", "10")),
+    timeout=(
+        float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10")),
+        float(os.environ.get("HTTP_READ_TIMEOUT", "60")),
+    ),
+    retries=int(os.environ.get("HTTP_RETRIES", "3")),
+    backoff=float(os.environ.get("HTTP_BACKOFF", "0.5")),
+    gzip=os.environ.get("HTTP_GZIP", "true").lower() == "true",
+)
+
+
+class StacDocumentCache:
+    """Process-wide disk cache of the STAC documents read from S3 and HTTP.
+
+    Documents are kept by URL and scope with their ETag and Last-Modified. The
+    scope identifies the credentials a document was read with, so that documents
+    of private storage are only read back with the same credentials. Within
+    `max_age` seconds of being fetched or revalidated they are read from disk,
+    after that they are revalidated with a conditional GET, which costs no
+    transfer when they did not change. The least recently validated documents
+    are evicted beyond `max_bytes`. Without a path, nothing is cached.
+    """
+
+    def __init__(self, path=None, max_age=60, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    def configure(self, path=None, max_age=None, max_bytes=None):
+        """Update the cache settings, a new path starts from the documents found there."""
+        with self._lock:
+            if path is not None and path != self.path:
+                self.path = path
+                self._bytes = None
+            if max_age is not None:
+                self.max_age = max_age
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+
+    def _entry_path(self, url, scope):
+        return os.path.join(
+            self.path, hashlib.sha256(f"{scope}\0{url}".encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def read(self, url, fetch, scope=""):
+        """
+        Return the text of the document at `url`.
+
+        :param url: the URL of the document
+        :param fetch: callable given the validators of the cached document (None
+            when there is none) returning (text, etag, last_modified), or None
+            when the document did not change
+        :param scope: identity of the credentials of `fetch`, empty for anonymous reads
+        """
+        if self.path is None:
+            return fetch(None)[0]
+
+        entry_path = self._entry_path(url, scope)
+        try:
+            with open(entry_path) as stream:
+                entry = json.load(stream)
+            validated = os.path.getmtime(entry_path)
+        except (OSError, ValueError):
+            entry = None
+
+        validators = None
+        if entry is not None and entry.get("url") == url and entry.get("scope", "") == scope:
+            if time.time() - validated < self.max_age:
+                self.hits += 1
+                return entry["text"]
+            validators = {"etag": entry.get("etag"), "last_modified": entry.get("last_modified")}
+
+        document = fetch(validators)
+        if document is None:
+            self.revalidated += 1
+            try:
+                os.utime(entry_path)
+            except OSError:
+                pass
+            return entry["text"]
+        self.misses += 1
+
+        text, etag, last_modified = document
+        if etag is not None or last_modified is not None:
+            self._store(
+                entry_path,
+                {"url": url, "scope": scope, "etag": etag, "last_modified": last_modified, "text": text},
+            )
+        return text
+
+    def _store(self, entry_path, entry):
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        try:
+            previous = os.path.getsize(entry_path)
+        except OSError:
+            previous = 0
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # documents of private storage are readable by the service user only
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as stream:
+            json.dump(entry, stream)
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._bytes += os.path.getsize(entry_path) - previous
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        with os.scandir(self.path) as scan:
+            for dir_entry in scan:
+                if dir_entry.name.endswith(".json"):
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue
+                    yield dir_entry.path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """
+        Drop the least recently validated documents until the cache fits in max_bytes.
+        """
+        # other processes may share the directory, so it is measured again
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+stac_document_cache = StacDocumentCache(
+    path=os.environ.get("STAC_CACHE_DIR") or None,
+    max_age=float(os.environ.get("STAC_CACHE_MAX_AGE", "60")),
+    max_bytes=int(os.environ.get("STAC_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+)
+
+
+class CustomStacIO(DefaultStacIO):
+    """
+    Custom STAC IO class that uses boto3 to read from S3.
+
+    The S3 connection settings are given per instance, so that the executions
+    of a process each use their own credentials. Instances created by pystac
+    itself fall back to the AWS_* environment variables.
+    """
+
+    def __init__(
+        self,
+        endpoint_url=None,
+        region_name=None,
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        proxies=None,
+    ):
+        super().__init__()
+        endpoint_url = endpoint_url or os.environ.get("AWS_S3_ENDPOINT")
+        aws_access_key_id = aws_access_key_id or os.environ.get("AWS_ACCESS_KEY_ID")
+        aws_secret_access_key = aws_secret_access_key or os.environ.get("AWS_SECRET_ACCESS_KEY")
+        self.s3_client = s3_client_cache.get_client(
+            endpoint_url=endpoint_url,
+            region_name=region_name or os.environ.get("AWS_REGION"),
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            proxies=proxies,
+        )
+        # S3 documents are cached per credentials, HTTP ones are read anonymously
+        self.s3_cache_scope = hashlib.sha256(
+            f"{endpoint_url}\0{aws_access_key_id}\0{aws_secret_access_key}".encode("utf-8")
+        ).hexdigest()
+
+    def read_text(self, source, *args, **kwargs):
+        parsed = urlparse(str(source))
+        if parsed.scheme == "s3":
+            return stac_document_cache.read(
+                str(source),
+                lambda validators: self._fetch_s3(parsed.netloc, parsed.path[1:], validators),
+                scope=self.s3_cache_scope,
+            )
+        elif parsed.scheme in ("http", "https"):
+            return stac_document_cache.read(
+                str(source), lambda validators: self._fetch_http(str(source), validators)
+            )
+        else:
+            return super().read_text(source, *args, **kwargs)
+
+    def _fetch_s3(self, bucket, key, validators):
+        """Get an S3 object, or None when it still matches the validators."""
+        conditions = {}
+        if validators is not None and validators.get("etag"):
+            conditions["IfNoneMatch"] = validators["etag"]
+        elif validators is not None and validators.get("last_modified"):
+            conditions["IfModifiedSince"] = parsedate_to_datetime(validators["last_modified"])
+        try:
+            response = self.s3_client.get_object(Bucket=bucket, Key=key, **conditions)
+        except ClientError as e:
+            if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304:
+                return None
+            raise
+        last_modified = response.get("LastModified")
+        return (
+            response["Body"].read().decode("utf-8"),
+            response.get("ETag"),
+            (
+                format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+                if last_modified is not None
+                else None
+            ),
+        )
+
+    def _fetch_http(self, url, validators):
+        """GET an HTTP document, or None when it still matches the validators."""
+        headers = dict(getattr(self, "headers", None) or {})
+        if validators is not None and validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators is not None and validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        response = http_session_cache.get_session(url).get(
+            url, headers=headers, timeout=http_session_cache.timeout
+        )
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return (
+            response.content.decode("utf-8"),
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def iter_lines(self, source):
+        """
+        Open a text document and return an iterator over its lines.
+
+        S3 objects are streamed, other sources are read whole. Errors opening the
+        document are raised by this call, not while iterating.
+        """
+        parsed = urlparse(source)
+        if parsed.scheme == "s3":
+            body = self.s3_client.get_object(Bucket=parsed.netloc, Key=parsed.path[1:])["Body"]
+            return (line.decode("utf-8") for line in body.iter_lines(chunk_size=1024 * 1024))
+        else:
+            return iter(self.read_text(source).splitlines())
+
+    def write_text(self, dest, txt, *args, **kwargs):
+        parsed = urlparse(dest)
+        if parsed.scheme == "s3":
+            self.s3_client.put_object(
+                Body=txt.encode("UTF-8"),
+                Bucket=parsed.netloc,
+                Key=parsed.path[1:],
+                ContentType="application/geo+json",
+            )
+        else:
+            super().write_text(dest, txt, *args, **kwargs)
+
+
+StacIO.set_default(CustomStacIO)
+
+
+def iter_catalog_items(href, stac_io, max_workers=10):
+    """
+    Walk a STAC catalog and yield the (href, dict) pairs of all its items.
+
+    Items come in the order of pystac's Catalog.get_all_items: the items of a
+    catalog first, then those of its children, depth-first. Item documents are
+    read with a bounded thread pool, a window of a few times `max_workers` at a
+    time, so memory does not grow with the size of the catalog.
+
+    The dicts are the documents as stored: their links are not resolved, the href
+    paired with them stands for their self link, and the links keep the order of
+    the document, where pystac moves the self and parent links last.
+
+    :param href: href of the root catalog
+    :param stac_io: the StacIO used to read the documents
+    :param max_workers: maximum number of concurrent reads, 1 reads sequentially
+    """
+    window = max(1, max_workers) * 4
+
+    def walk(catalog_href, executor):
+        document = stac_io.read_json(catalog_href)
+        links = document.get("links", [])
+        item_hrefs = [
+            make_absolute_href(link["href"], catalog_href)
+            for link in links
+            if link.get("rel") == "item"
+        ]
+        child_hrefs = [
+            make_absolute_href(link["href"], catalog_href)
+            for link in links
+            if link.get("rel") == "child"
+        ]
+        del document, links
+
+        for start in range(0, len(item_hrefs), window):
+            chunk = item_hrefs[start:start + window]
+            yield from zip(chunk, executor.map(stac_io.read_json, chunk))
+        for child_href in child_hrefs:
+            yield from walk(child_href, executor)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        yield from walk(href, executor)
+
+
+def iter_manifest_items(href, stac_io):
+    """
+    Return an iterator over the (href, dict) pairs of the items of a manifest.
+
+    Each line of the manifest is an item document, as written next to it by
+    stage-out, and its self link gives the href the item resolves against. The
+    manifest is opened by this call, so a missing manifest raises here and the
+    caller can walk the catalog instead.
+
+    :param href: href of the manifest
+    :param stac_io: the CustomStacIO used to read it
+    """
+    lines = stac_io.iter_lines(href)
+
+    def parse():
+        for line in lines:
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            self_href = next(
+                (link["href"] for link in document.get("links", []) if link.get("rel") == "self"), None
+            )
+            if self_href is None:
+                raise ValueError(f"Item {document.get('id')} of manifest {href} has no self link")
+            yield make_absolute_href(self_href, href), document
+
+    return parse()
@@ -0,0 +1,286 @@
+"""
+Warm worker pool for the service.
+
+Started once next to the ZOO-Kernel, the pool imports the execution handler and
+its dependencies and parses the application package, then forks workers that
+accept executions on a local Unix socket. Each worker keeps its clients (S3
+clients, the workspace credential cache) across the executions it runs and is
+replaced after `max_jobs` of them.
+
+    python -m <service_name>.worker --socket /tmp/<service_name>.sock --workers 4
+
+With `worker_socket` set in the [eoepca] section of the ZOO configuration to the
+same path, the entry functions of service.py (the batch one included) forward
+`conf`, `inputs` and `outputs` to a worker and write back what the execution set
+in them. The environment of the shim, which ZOO sets per request (e.g.
+SERVICES_NAMESPACE), is forwarded too and is the one of the execution. Progress
+reported by the execution is relayed to the shim, which reports it to ZOO.
+
+Connections are authenticated with the key in `<socket>.key`, created with mode
+0600 when missing, so only the processes that can read it (the user running the
+pool and the ZOO-Kernel) can hand executions to the workers.
+"""
+import argparse
+import importlib
+import os
+import signal
+import sys
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from loguru import logger
+
+from .service import zoo
+
+# imported before forking, so that workers start with them loaded
+WARM_MODULES = ["botocore.session", "botocore.exceptions", "jwt", "pystac", "requests", "yaml"]
+
+# the functions of the handler the workers run, from the entry functions of service.py
+ENTRIES = ("execute", "execute_batch")
+
+
+class WorkerUnavailable(Exception):
+    """Raised when the execution could not be handed to a worker, nothing has run yet."""
+
+
+def authkey_path(socket_path):
+    """
+    The file holding the key that authenticates the connections to the pool on
+    `socket_path`.
+    """
+    return f"{socket_path}.key"
+
+
+def read_authkey(socket_path, create=False):
+    """
+    Read the key of the pool on `socket_path`.
+
+    :param create: create a random key, readable by its owner only, when there is none
+    """
+    path = authkey_path(socket_path)
+    if create:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "wb") as stream:
+                stream.write(os.urandom(32).hex().encode("ascii"))
+    with open(path, "rb") as stream:
+        return stream.read().strip()
+
+
+def forward(socket_path, conf, inputs, outputs, entry="execute", environ=None):
+    """
+    Run an execution on the worker pool listening on `socket_path`.
+
+    :param socket_path: the Unix socket of the worker pool
+    :param conf: the ZOO configuration, updated with the one of the execution
+    :param inputs: the inputs of the execution
+    :param outputs: the outputs, updated with the ones set by the execution
+    :param entry: the function of the handler running it, one of ENTRIES
+    :param environ: the environment of the execution, by default the one of this process
+    :return: the ZOO status of the execution
+    """
+    try:
+        connection = Client(socket_path, family="AF_UNIX", authkey=read_authkey(socket_path))
+    except (OSError, AuthenticationError) as e:
+        raise WorkerUnavailable(f"cannot connect to {socket_path}: {e}") from e
+
+    with connection:
+        try:
+            environ = dict(os.environ if environ is None else environ)
+            connection.send((entry, conf, inputs, outputs, environ))
+        except OSError as e:
+            raise WorkerUnavailable(f"cannot send the execution to {socket_path}: {e}") from e
+
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError) as e:
+                logger.error(f"Lost the worker running the execution: {e}")
+                conf["lenv"]["message"] = zoo._("Worker lost during execution")
+                return zoo.SERVICE_FAILED
+
+            if message[0] == "status":
+                _, progress, status_message = message
+                if status_message is not None:
+                    conf["lenv"]["message"] = status_message
+                zoo.update_status(conf, progress)
+                continue
+
+            _, status, result_conf, result_outputs = message
+            conf.update(result_conf)
+            outputs.update(result_outputs)
+            return status
+
+
+def warm_up():
+    """
+    Import what executions use and parse the application package, once for all workers.
+    """
+    handler = importlib.import_module(".handler", __package__)
+    importlib.import_module(".stac_io", __package__)
+    for module in WARM_MODULES:
+        importlib.import_module(module)
+
+    handler.load_yaml_cached(
+        os.path.join(os.path.dirname(os.path.realpath(__file__)), "app-package.cwl")
+    )
+    return handler
+
+
+def _status_reporters():
+    """The zoo modules (or stubs) progress is reported through during an execution."""
+    reporters = [zoo]
+    runner_zoo = getattr(sys.modules.get("zoo_calrissian_runner"), "zoo", None)
+    if runner_zoo is not None and runner_zoo is not zoo:
+        reporters.append(runner_zoo)
+    return reporters
+
+
+@contextmanager
+def _environ(environ):
+    """Make `environ` the environment of the process for the block, then restore it."""
+    saved = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(environ)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+def _work(listener, handler, max_jobs):
+    """Worker loop: run executions accepted on `listener` until `max_jobs` have run."""
+    cwd = os.getcwd()
+    reporters = _status_reporters()
+    update_status = [reporter.update_status for reporter in reporters]
+
+    jobs = 0
+    while jobs < max_jobs:
+        try:
+            connection = listener.accept()
+        except (AuthenticationError, EOFError, OSError) as e:
+            logger.warning(f"Refused a connection: {e}")
+            continue
+        jobs += 1
+        with connection:
+            try:
+                entry, conf, inputs, outputs, environ = connection.recv()
+            except (EOFError, OSError, ValueError) as e:
+                logger.warning(f"Dropped an execution request: {e}")
+                continue
+            if entry not in ENTRIES:
+                logger.warning(f"Dropped an execution request for {entry}")
+                continue
+
+            def relay(conf, progress):
+                try:
+                    connection.send(("status", progress, conf.get("lenv", {}).get("message")))
+                except OSError:
+                    pass
+
+            for reporter in reporters:
+                reporter.update_status = relay
+            try:
+                with _environ(environ):
+                    status = getattr(handler, entry)(conf, inputs, outputs)
+            finally:
+                for reporter, original in zip(reporters, update_status):
+                    reporter.update_status = original
+                # executions change to their own working directory
+                os.chdir(cwd)
+
+            try:
+                connection.send(("result", status, conf, outputs))
+            except OSError as e:
+                logger.warning(f"Could not return the result of the execution: {e}")
+
+
+def serve(socket_path, workers=4, max_jobs=100):
+    """
+    Run the worker pool on `socket_path` until terminated.
+
+    :param socket_path: the Unix socket to listen on, replaced if it exists
+    :param workers: the number of executions run concurrently
+    :param max_jobs: the number of executions after which a worker is replaced
+    """
+    handler = warm_up()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    authkey = read_authkey(socket_path, create=True)
+    # the socket is created accessible to its owner and group only
+    umask = os.umask(0o117)
+    try:
+        listener = Listener(socket_path, family="AF_UNIX", backlog=max(workers * 4, 16), authkey=authkey)
+    finally:
+        os.umask(umask)
+
+    children = set()
+
+    # the pool reacts to its signals synchronously: workers exiting, and the
+    # request to stop, are handled between two waits rather than interrupting them
+    signals = {signal.SIGCHLD, signal.SIGTERM, signal.SIGINT}
+    signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, signals)
+            code = 0
+            try:
+                _work(listener, handler, max_jobs)
+            except BaseException:
+                logger.exception("Worker failed")
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    logger.info(f"Serving {workers} workers on {socket_path}")
+    try:
+        for _ in range(workers):
+            spawn()
+        while signal.sigwaitinfo(signals).si_signo == signal.SIGCHLD:
+            # SIGCHLD is not queued, one signal may stand for several workers
+            while children:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                children.discard(pid)
+                spawn()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        listener.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, signals)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--socket", required=True, help="the Unix socket to listen on")
+    parser.add_argument(
+        "--workers", type=int, default=4, help="the number of executions run concurrently"
+    )
+    parser.add_argument(
+        "--max-jobs", type=int, default=100, help="executions after which a worker is replaced"
+    )
+    args = parser.parse_args()
+
+    serve(args.socket, workers=args.workers, max_jobs=args.max_jobs)
+
+
+if __name__ == "__main__":
+    main()